@@ -0,0 +1,130 @@
+"""
+Peak-RSS benchmark for streaming prospect ingestion.
+
+For every batch size, a fresh subprocess generates a JSONL (or CSV) prospect file,
+streams it through ingest.iter_prospects -> process_stream -> ResultSink and
+reports its peak RSS. The crew itself is replaced by a constant delivery result,
+so the numbers isolate the batch bookkeeping: peak RSS should not grow with the
+number of prospects. --eager runs the same batch the pre-streaming way (whole
+file loaded into a list, results kept in memory) for comparison.
+
+Usage: PYTHONPATH=src python benchmarks/ingest_memory.py [--sizes 1000,100000,1000000] [--format csv] [--eager]
+Exits non-zero if peak RSS grows by more than --max-growth-mb from the smallest to the largest size.
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+FIELDS = ["name", "title", "company", "industry", "linkedin_url", "our_product", "email_address"]
+
+
+def _prospect(n):
+    return {
+        "name": f"Prospect {n}",
+        "title": "Head of Data",
+        "company": f"Company {n % 5000} Ltd",
+        "industry": "Software",
+        "linkedin_url": f"https://www.linkedin.com/in/prospect-{n}",
+        "our_product": "SynergyAI Data Analytics Suite",
+        "email_address": f"prospect{n}@company{n % 5000}.com",
+    }
+
+
+def write_prospects(path, count, fmt):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for n in range(count):
+                writer.writerow(_prospect(n))
+        else:
+            for n in range(count):
+                f.write(json.dumps(_prospect(n)) + "\n")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _deliver(inputs):
+    return [{"status_code": 200, "success": True, "variant_id": None}]
+
+
+def measure(count, fmt, eager):
+    """Run one batch in this process and return its report (called in the child)."""
+    from sales_personalized_email.ingest import ProspectResult, ResultSink, iter_prospects, process_stream
+
+    workdir = tempfile.mkdtemp(prefix="ingest-bench-")
+    prospects_path = os.path.join(workdir, f"prospects.{fmt if fmt == 'csv' else 'jsonl'}")
+    results_path = os.path.join(workdir, "results.jsonl")
+    write_prospects(prospects_path, count, fmt)
+    baseline = _peak_rss_mb()
+
+    started = time.perf_counter()
+    if eager:
+        prospects = list(iter_prospects(prospects_path))
+        results = [ProspectResult.from_delivery(line, inputs, _deliver(inputs)).to_dict() for line, inputs in prospects]
+        with open(results_path, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        counts = {"delivered": len(results)}
+    else:
+        with ResultSink(results_path) as sink:
+            counts = process_stream(iter_prospects(prospects_path), sink, _deliver)
+    elapsed = time.perf_counter() - started
+
+    for path in (prospects_path, results_path):
+        os.remove(path)
+    os.rmdir(workdir)
+    return {
+        "prospects": count,
+        "mode": "eager" if eager else "streaming",
+        "counts": counts,
+        "seconds": round(elapsed, 2),
+        "prospects_per_second": round(count / elapsed) if elapsed else 0,
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak-RSS benchmark for streaming prospect ingestion.")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma separated batch sizes")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--eager", action="store_true", help="Load everything into memory, for comparison")
+    parser.add_argument("--max-growth-mb", type=float, default=16.0,
+                        help="Allowed peak RSS growth from the smallest to the largest size")
+    parser.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.format, args.eager)))
+        return
+
+    reports = []
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        command = [sys.executable, __file__, "--child", str(size), "--format", args.format]
+        if args.eager:
+            command.append("--eager")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        reports.append(report)
+        print(json.dumps(report))
+
+    growth = reports[-1]["peak_rss_mb"] - reports[0]["peak_rss_mb"]
+    print(f"Peak RSS growth from {reports[0]['prospects']} to {reports[-1]['prospects']} prospects: {growth:.1f} MB")
+    if not args.eager and growth > args.max_growth_mb:
+        print(f"FAIL: peak RSS grew by more than {args.max_growth_mb} MB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
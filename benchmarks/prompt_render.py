@@ -0,0 +1,104 @@
+"""
+Prompt setup cost per prospect of the agents.yaml / tasks.yaml prompts, as a crew run pays it.
+
+Compares, for the same prospects:
+  per_run_yaml   what every crew instance used to do: parse both YAML files, then
+                 crewai interpolates every prompt string with interpolate_only at kickoff
+  cached_config  what it does now: prompts.load_config (deep copy of the YAML parsed
+                 once per process), validate_inputs, then the same crewai interpolation
+  interpolate    crewai's interpolation alone, which every kickoff pays either way
+  validate_only  prompts.validate_inputs, the submission-time check
+
+Usage: PYTHONPATH=src python benchmarks/prompt_render.py [--prospects 2000]
+"""
+import argparse
+import json
+import time
+
+import yaml
+from crewai.utilities.string_utils import interpolate_only
+
+from sales_personalized_email import prompts
+
+
+def _prospects(count):
+    return [
+        {
+            "name": f"Prospect {n}",
+            "title": "Head of Data",
+            "company": f"Company {n % 500} Ltd",
+            "industry": "Software",
+            "linkedin_url": f"https://www.linkedin.com/in/prospect-{n}",
+            "our_product": f"Product {n % 3}",
+            "email_address": f"prospect{n}@company{n % 500}.com",
+            "num_variants": 1 + n % 3,
+        }
+        for n in range(count)
+    ]
+
+
+def _interpolate(configs, inputs):
+    # Same string fields crewai interpolates (agent role/goal/backstory, task
+    # description/expected_output); interpolating every string field is a slight overestimate
+    return {
+        (kind, entry_name, field): interpolate_only(value, inputs)
+        for kind, config in configs.items()
+        for entry_name, entry in config.items()
+        for field, value in entry.items()
+        if isinstance(value, str)
+    }
+
+
+def per_run_yaml(inputs):
+    configs = {}
+    for kind, filename in prompts.CONFIG_FILES.items():
+        with open(prompts.CONFIG_DIR / filename, encoding="utf-8") as f:
+            configs[kind] = yaml.safe_load(f)
+    return _interpolate(configs, inputs)
+
+
+def cached_config(inputs):
+    configs = {kind: prompts.load_config(kind) for kind in prompts.CONFIG_FILES}
+    prompts.validate_inputs(inputs)
+    return _interpolate(configs, inputs)
+
+
+_CONFIGS = {kind: prompts.load_config(kind) for kind in prompts.CONFIG_FILES}
+
+
+def interpolate(inputs):
+    return _interpolate(_CONFIGS, inputs)
+
+
+def _time_per_prospect(func, prospects):
+    started = time.perf_counter()
+    for inputs in prospects:
+        func(inputs)
+    return (time.perf_counter() - started) / len(prospects) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt setup per prospect.")
+    parser.add_argument("--prospects", type=int, default=2000)
+    args = parser.parse_args()
+
+    prospects = _prospects(args.prospects)
+    # Same prompts either way, so the comparison is like for like
+    assert cached_config(prospects[0]) == per_run_yaml(prospects[0])
+
+    timings = {
+        "per_run_yaml": _time_per_prospect(per_run_yaml, prospects),
+        "cached_config": _time_per_prospect(cached_config, prospects),
+        "interpolate": _time_per_prospect(interpolate, prospects),
+        "validate_only": _time_per_prospect(prompts.validate_inputs, prospects),
+    }
+    report = {
+        "prospects": args.prospects,
+        "us_per_prospect": {name: round(us, 1) for name, us in timings.items()},
+        "speedup": round(timings["per_run_yaml"] / timings["cached_config"], 1),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_PATH = "email_archive.sqlite3"
+DEFAULT_COMMIT_BATCH_SIZE = 100
+DEFAULT_COMMIT_INTERVAL_SECONDS = 5.0
+
+COLUMNS = [
+    "created_at", "run_id", "prospect_name", "email", "company", "title", "industry",
+    "variant_id", "subject", "body", "follow_up_notes", "inputs_json", "timings_json",
+    "delivery_success", "delivery_status_code", "delivery_response",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    run_id TEXT,
+    prospect_name TEXT,
+    email TEXT,
+    company TEXT,
+    title TEXT,
+    industry TEXT,
+    variant_id TEXT,
+    subject TEXT,
+    body TEXT,
+    follow_up_notes TEXT,
+    inputs_json TEXT,
+    timings_json TEXT,
+    delivery_success INTEGER,
+    delivery_status_code INTEGER,
+    delivery_response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_emails_email ON emails (email);
+CREATE INDEX IF NOT EXISTS idx_emails_company ON emails (company);
+CREATE INDEX IF NOT EXISTS idx_emails_created_at ON emails (created_at);
+"""
+
+
+def archive_path():
+    """
+    Path of the local archive, from EMAIL_ARCHIVE_PATH.
+    Setting EMAIL_ARCHIVE_PATH to an empty string disables archiving.
+    """
+    return os.environ.get("EMAIL_ARCHIVE_PATH", DEFAULT_ARCHIVE_PATH) or None
+
+
+class EmailArchive:
+    """
+    Local SQLite archive of every generated email with its inputs, timings and
+    delivery status. Rows are buffered and written in batched transactions, either
+    when batch_size rows are pending or, from a timer, once the oldest pending row
+    is commit_interval seconds old.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_COMMIT_BATCH_SIZE, commit_interval=DEFAULT_COMMIT_INTERVAL_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._commit_timer = None # Commits the pending rows commit_interval after the first one
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def record(self, inputs, email, variant_id=None, run_id=None, timings=None, delivery=None):
+        """
+        Queue one generated email for the archive.
+
+        Args:
+            inputs: the prospect inputs the crew ran with
+            email: dict with subject_line, email_body and (optionally) follow_up_notes
+            variant_id: A/B variant identifier, if any
+            run_id: id of the crew run that produced the email
+            timings: dict of timing measurements (e.g. seconds per task)
+            delivery: the send_email_to_api result dict, if delivery was attempted
+        """
+        delivery = delivery or {}
+        row = (
+            datetime.now(timezone.utc).isoformat(),
+            run_id,
+            inputs.get("name"),
+            inputs.get("email_address") or inputs.get("email"),
+            inputs.get("company"),
+            inputs.get("title"),
+            inputs.get("industry"),
+            variant_id,
+            email.get("subject_line"),
+            email.get("email_body"),
+            email.get("follow_up_notes"),
+            json.dumps(inputs, ensure_ascii=False, default=str),
+            json.dumps(timings, default=str) if timings else None,
+            None if "success" not in delivery else int(bool(delivery["success"])),
+            delivery.get("status_code"),
+            delivery.get("response_text"),
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+            elif self._commit_timer is None:
+                # No later record() may come (a single run, the last background
+                # delivery), so the interval cannot wait for the next write
+                self._commit_timer = threading.Timer(self.commit_interval, self.flush)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._commit_timer is not None:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if not self._pending:
+            return
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._conn:
+            self._conn.executemany(f"INSERT INTO emails ({', '.join(COLUMNS)}) VALUES ({placeholders})", self._pending)
+        logger.debug(f"Archived {len(self._pending)} email(s) to {self.path}")
+        self._pending = []
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def find(self, email=None, company=None, since=None, limit=100):
+        """
+        Look up archived emails by prospect email, company and/or creation date (ISO string).
+
+        Returns:
+            List of row dicts, newest first.
+        """
+        clauses, params = [], []
+        if email:
+            clauses.append("email = ?")
+            params.append(email)
+        if company:
+            clauses.append("company = ?")
+            params.append(company)
+        if since:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        self.flush()
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM emails {where} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit),
+            )
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def already_sent(self, email, subject):
+        """True if an email with this subject was already delivered to this address (dedup)."""
+        self.flush()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM emails WHERE email = ? AND subject = ? AND delivery_success = 1 LIMIT 1",
+                (email, subject),
+            ).fetchone()
+        return row is not None
+
+    def export(self, out_path, since=None, batch_size=10_000):
+        """
+        Stream the archive into a Parquet file (or an Arrow IPC file for .arrow/.feather)
+        in record batches, so memory use does not grow with the archive size.
+        Requires the optional pyarrow dependency.
+
+        Returns:
+            Number of rows exported.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Exporting the email archive requires pyarrow: pip install 'sales_personalized_email[archive]'") from e
+
+        schema = pa.schema(
+            [("id", pa.int64())]
+            + [(name, pa.int64() if name in ("delivery_success", "delivery_status_code") else pa.string()) for name in COLUMNS]
+        )
+        self.flush()
+        # A separate read-only connection keeps the export from blocking writers
+        reader = sqlite3.connect(self.path)
+        try:
+            cursor = reader.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM emails {'WHERE created_at >= ?' if since else ''} ORDER BY id",
+                (since,) if since else (),
+            )
+            if str(out_path).endswith((".arrow", ".feather")):
+                writer = pa.ipc.new_file(str(out_path), schema)
+            else:
+                writer = pq.ParquetWriter(str(out_path), schema)
+            exported = 0
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    writer.write_batch(pa.RecordBatch.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                        schema=schema,
+                    ))
+                    exported += len(rows)
+            finally:
+                writer.close()
+        finally:
+            reader.close()
+        logger.info(f"Exported {exported} archived email(s) to {out_path}")
+        return exported
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Process-wide archive instance, or None if archiving is disabled."""
+    global _archive
+    path = archive_path()
+    if not path:
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = EmailArchive(path)
+            atexit.register(_archive.close)
+        return _archive
+
+
+def flush_archive():
+    """
+    Commit the process-wide archive's buffered rows, if it is open. Batch entry
+    points call this when they finish: process pool workers leave with os._exit
+    and never run the atexit close, and hosts may kill the process.
+    """
+    with _archive_lock:
+        archive = _archive
+    if archive is None:
+        return
+    try:
+        archive.flush()
+    except Exception as e:
+        logger.error(f"Failed to flush the email archive: {e}")
+
+
+def archive_email(inputs, email, variant_id=None, run_id=None, timings=None, delivery=None):
+    """
+    Record an email in the process-wide archive. Archiving must never break delivery,
+    so errors are logged and swallowed.
+    """
+    try:
+        archive = get_archive()
+        if archive:
+            archive.record(inputs, email, variant_id=variant_id, run_id=run_id, timings=timings, delivery=delivery)
+    except Exception as e:
+        logger.error(f"Failed to archive email for {inputs.get('email_address')}: {e}")
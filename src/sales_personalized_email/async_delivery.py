@@ -0,0 +1,178 @@
+"""
+Background asyncio delivery to the store-emails API.
+
+A single daemon thread runs an event loop with one shared httpx.AsyncClient, so
+every send in the process reuses the same keep-alive connection pool (at most
+EMAIL_API_MAX_CONNECTIONS connections). submit() schedules a coroutine on that
+loop from any thread and returns a concurrent.futures.Future at once; the crew's
+worker thread never waits for an HTTP round trip. flush() waits for everything
+submitted so far and runs automatically at interpreter exit.
+
+EMAIL_DELIVERY_MODE selects how the crew callback delivers: "sync" (default)
+inline on the crew's thread as before, or "async" through this service.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+import httpx
+
+from sales_personalized_email.archive import get_archive
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_MODES = ("sync", "async")
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+def delivery_mode():
+    """Delivery mode from EMAIL_DELIVERY_MODE, "sync" unless set to "async"."""
+    value = os.environ.get("EMAIL_DELIVERY_MODE", "").strip().lower() or "sync"
+    if value not in DELIVERY_MODES:
+        logger.warning(f"Unknown EMAIL_DELIVERY_MODE={value!r}, expected one of {DELIVERY_MODES}; using sync")
+        return "sync"
+    return value
+
+
+class AsyncDeliveryService:
+    """
+    Event loop on a background thread plus the shared HTTP client it sends with.
+    The loop and client are created lazily by the first submit().
+    """
+
+    def __init__(self, max_connections=None, timeout=DEFAULT_REQUEST_TIMEOUT_SECONDS):
+        self.max_connections = max_connections or int(
+            os.environ.get("EMAIL_API_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)
+        )
+        self.timeout = timeout
+        self.client = None
+        self._slots = None
+        self._loop = None
+        self._thread = None
+        self._closed = False
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock) # Notified whenever a delivery finishes
+        self._counts = {"submitted": 0, "completed": 0, "errors": 0}
+
+    def _start(self):
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self._loop)
+            self.client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._slots = asyncio.Semaphore(self.max_connections)
+            ready.set()
+            self._loop.run_forever()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=run_loop, name="email-delivery", daemon=True)
+        self._thread.start()
+        ready.wait()
+        logger.info(f"Started background email delivery (max {self.max_connections} connections)")
+
+    async def post(self, url, **kwargs):
+        """
+        client.post, with at most max_connections requests in flight. Requests queue
+        here rather than inside the connection pool, whose wait queue gets slow
+        when thousands of records are submitted at once.
+        """
+        async with self._slots:
+            return await self.client.post(url, **kwargs)
+
+    def submit(self, send, *args):
+        """
+        Schedule send(self, *args), a coroutine function, on the delivery loop;
+        send posts through self.post.
+
+        Returns:
+            concurrent.futures.Future with send's result.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Email delivery service is closed")
+            if self._loop is None:
+                self._start()
+            future = asyncio.run_coroutine_threadsafe(send(self, *args), self._loop)
+            self._pending.add(future)
+            self._counts["submitted"] += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            self._counts["completed"] += 1
+            if future.cancelled() or future.exception() is not None:
+                self._counts["errors"] += 1
+            self._idle.notify_all()
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Background email delivery failed: {future.exception()}")
+
+    def flush(self, timeout=None):
+        """
+        Wait until every delivery submitted so far (and any submitted meanwhile) is done.
+
+        Returns:
+            True if nothing is left pending, False if the timeout ran out first.
+        """
+        with self._idle:
+            if self._pending:
+                logger.info(f"Waiting for {len(self._pending)} background email deliveries")
+            if self._idle.wait_for(lambda: not self._pending, timeout):
+                return True
+            logger.warning(f"{len(self._pending)} background email deliveries still pending after {timeout}s")
+            return False
+
+    def close(self, timeout=None):
+        """Flush, then close the HTTP client and stop the loop. Later submits raise RuntimeError."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush(timeout)
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self._loop).result(timeout)
+        except Exception as e:
+            logger.error(f"Failed to close the email delivery client: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, pending=len(self._pending))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_delivery_service():
+    """Process-wide delivery service, flushed and closed at interpreter exit."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AsyncDeliveryService()
+            # atexit runs handlers last-in first-out: open the archive first so the
+            # final flush can still archive what it sends
+            get_archive()
+            atexit.register(_service.close)
+        return _service
+
+
+def flush_deliveries(timeout=None):
+    """Wait for the process-wide service's pending deliveries (no-op if it never started)."""
+    with _service_lock:
+        service = _service
+    return service.flush(timeout) if service else True
@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keep the default run budget below the Streamlit client's POLLING_TIMEOUT_SECONDS
+# (360 s), so a run finishes with an email before the client gives up on it
+DEFAULT_RUN_BUDGET_SECONDS = 300.0
+# Seconds of the run budget kept back for the agents after research, so research
+# that runs long still leaves time to write the email
+DEFAULT_RESERVE_SECONDS = 90.0
+# The reserve is clamped to this share of the run budget, so a short run budget
+# (say 60 s with the default 90 s reserve) still leaves the first agents time
+MAX_RESERVE_FRACTION = 0.5
+
+
+def _env_number(name, cast=float):
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        number = cast(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        return None
+    return number if number > 0 else None
+
+
+class RunBudget:
+    """
+    Wall-clock and step budgets for one crew run and for each of its agents.
+
+    Agents run one after another, so an agent's clock starts when the previous
+    task finishes. An agent over its budget is not failed: the crew asks it for
+    its final answer with what it has gathered so far.
+
+    Read from the environment by from_env():
+        CREW_RUN_BUDGET_SECONDS          whole run (default 300, 0 disables)
+        CREW_RUN_MAX_STEPS               agent steps + tool calls across the run
+        CREW_BUDGET_RESERVE_SECONDS      run time kept back for the last agent (default 90,
+                                         at most MAX_RESERVE_FRACTION of the run budget)
+        CREW_AGENT_BUDGET_SECONDS        default per-agent wall clock
+        CREW_AGENT_MAX_ITER              default per-agent max_iter
+        CREW_<AGENT>_BUDGET_SECONDS      per-agent override, e.g. CREW_PROSPECT_RESEARCHER_BUDGET_SECONDS
+        CREW_<AGENT>_MAX_ITER            per-agent override, e.g. CREW_PROSPECT_RESEARCHER_MAX_ITER
+    """
+
+    def __init__(self, run_seconds=DEFAULT_RUN_BUDGET_SECONDS, run_max_steps=None,
+                 reserve_seconds=DEFAULT_RESERVE_SECONDS, agent_seconds=None, agent_max_iter=None):
+        self.run_seconds = run_seconds
+        self.run_max_steps = run_max_steps
+        self.reserve_seconds = reserve_seconds or 0.0
+        if run_seconds and self.reserve_seconds > run_seconds * MAX_RESERVE_FRACTION:
+            clamped = run_seconds * MAX_RESERVE_FRACTION
+            logger.warning(
+                f"Budget reserve of {self.reserve_seconds:g}s does not fit a {run_seconds:g}s run budget, "
+                f"using {clamped:g}s"
+            )
+            self.reserve_seconds = clamped
+        self.agent_seconds = dict(agent_seconds or {}) # agent name -> seconds, "*" for the default
+        self.agent_max_iter = dict(agent_max_iter or {}) # agent name -> max_iter, "*" for the default
+        self.steps = 0
+        self.exhausted = {} # agent name -> reason its answer was forced
+        self._paused_at = None
+        self._lock = threading.Lock()
+        self.start()
+
+    @classmethod
+    def from_env(cls, agent_names=()):
+        run_seconds = os.environ.get("CREW_RUN_BUDGET_SECONDS", "").strip()
+        agent_seconds = {"*": _env_number("CREW_AGENT_BUDGET_SECONDS")}
+        agent_max_iter = {"*": _env_number("CREW_AGENT_MAX_ITER", int)}
+        for name in agent_names:
+            agent_seconds[name] = _env_number(f"CREW_{name.upper()}_BUDGET_SECONDS")
+            agent_max_iter[name] = _env_number(f"CREW_{name.upper()}_MAX_ITER", int)
+        reserve = _env_number("CREW_BUDGET_RESERVE_SECONDS")
+        return cls(
+            run_seconds=_env_number("CREW_RUN_BUDGET_SECONDS") if run_seconds else DEFAULT_RUN_BUDGET_SECONDS,
+            run_max_steps=_env_number("CREW_RUN_MAX_STEPS", int),
+            reserve_seconds=DEFAULT_RESERVE_SECONDS if reserve is None else reserve,
+            agent_seconds={k: v for k, v in agent_seconds.items() if v},
+            agent_max_iter={k: v for k, v in agent_max_iter.items() if v},
+        )
+
+    def start(self):
+        """(Re)start the run clock, at crew kickoff."""
+        self._paused_at = None
+        self.started_at = time.monotonic()
+        self.agent_started_at = self.started_at
+        self.steps = 0
+        self.exhausted = {}
+
+    def next_agent(self):
+        """Start the clock of the next agent, when the previous task has finished."""
+        self.agent_started_at = time.monotonic()
+
+    def pause(self):
+        """Stop the run clock, e.g. while a pipelined run waits for its next stage."""
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+
+    def resume(self):
+        """
+        Restart the run clock after pause(), leaving out the time spent paused, and
+        start the clock of the agent that runs next.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._paused_at is not None:
+                self.started_at += now - self._paused_at
+                self._paused_at = None
+            self.agent_started_at = now
+
+    def max_iter(self, agent_name):
+        return self.agent_max_iter.get(agent_name) or self.agent_max_iter.get("*")
+
+    def check(self, agent_name, last_agent=False, count_step=True):
+        """
+        Count a step of agent_name and check its budgets.
+
+        Args:
+            agent_name: Name of the agent taking the step.
+            last_agent: The last agent of the run gets the reserved time too.
+            count_step: False to check without counting a step.
+
+        Returns:
+            The reason the agent has to give its final answer now, or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if count_step:
+                self.steps += 1
+            reason = None
+            agent_seconds = self.agent_seconds.get(agent_name) or self.agent_seconds.get("*")
+            if agent_seconds and now - self.agent_started_at >= agent_seconds:
+                reason = f"agent budget of {agent_seconds:g}s used"
+            elif self.run_seconds:
+                deadline = self.run_seconds if last_agent else self.run_seconds - self.reserve_seconds
+                if now - self.started_at >= deadline:
+                    reason = f"run budget of {self.run_seconds:g}s used"
+            if reason is None and self.run_max_steps and self.steps >= self.run_max_steps:
+                reason = f"run budget of {self.run_max_steps} steps used"
+            if reason and agent_name not in self.exhausted:
+                self.exhausted[agent_name] = reason
+                logger.warning(
+                    f"Budget: {agent_name} {reason} after {now - self.started_at:.1f}s and {self.steps} steps, "
+                    f"asking for its final answer"
+                )
+            return reason
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "elapsed_seconds": round(time.monotonic() - self.started_at, 2),
+                "steps": self.steps,
+                "exhausted": dict(self.exhausted),
+            }
+
+
+def force_final_answer(agent):
+    """
+    Make the agent's executor ask for its final answer on its next iteration:
+    crewai treats the run as having reached max_iter and prompts the LLM to answer
+    with the information it has, instead of raising like max_execution_time.
+    """
+    executor = getattr(agent, "agent_executor", None)
+    if executor is None:
+        return
+    executor.max_iter = min(executor.max_iter, executor.iterations + 1)
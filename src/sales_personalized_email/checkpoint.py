@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Order of the crew's tasks; a resumed run continues from the first one missing here
+TASK_ORDER = ["research_prospect_task", "personalize_content_task", "write_email_task"]
+
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+# Checkpoints not updated for this long are deleted, delivered or not: long enough to
+# resume a failed batch, while a long-lived process does not fill the disk
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+# Deliveries trigger a prune of their directory at most this often (per process)
+PRUNE_INTERVAL_SECONDS = 3600
+
+_last_pruned = {} # directory -> time.monotonic() of its last prune
+_prune_lock = threading.Lock()
+
+
+def checkpoint_dir():
+    """
+    Directory checkpoints are written to, from CHECKPOINT_DIR.
+    Setting CHECKPOINT_DIR to an empty string disables checkpointing.
+    """
+    directory = os.environ.get("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+    return Path(directory) if directory else None
+
+
+def retention_seconds():
+    """
+    How long checkpoints are kept, from CHECKPOINT_RETENTION_SECONDS (default 7 days).
+    0 keeps them forever.
+    """
+    value = os.environ.get("CHECKPOINT_RETENTION_SECONDS", "").strip()
+    try:
+        return float(value) if value else DEFAULT_RETENTION_SECONDS
+    except ValueError:
+        logger.warning(f"Ignoring invalid CHECKPOINT_RETENTION_SECONDS={value!r}")
+        return DEFAULT_RETENTION_SECONDS
+
+
+def prune_checkpoints(directory=None, retention=None):
+    """
+    Delete checkpoint files last updated more than retention seconds ago (default
+    retention_seconds()), and the inputs-hash directories they leave empty.
+
+    Returns:
+        Number of checkpoint files deleted.
+    """
+    directory = Path(directory) if directory else checkpoint_dir()
+    retention = retention_seconds() if retention is None else retention
+    if not directory or not retention or not directory.is_dir():
+        return 0
+    cutoff = time.time() - retention
+    deleted = 0
+    for path in directory.glob("*/*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    for run_dir in directory.iterdir():
+        try:
+            run_dir.rmdir() # Only succeeds once the directory is empty
+        except OSError:
+            pass
+    if deleted:
+        logger.info(f"Pruned {deleted} checkpoint(s) older than {retention:g}s from {directory}")
+    return deleted
+
+
+def _prune_now_and_then(directory):
+    """prune_checkpoints(directory), unless this process did so in the last PRUNE_INTERVAL_SECONDS."""
+    now = time.monotonic()
+    with _prune_lock:
+        last = _last_pruned.get(directory)
+        if last is not None and now - last < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_pruned[directory] = now
+    try:
+        prune_checkpoints(directory)
+    except Exception as e:
+        logger.error(f"Failed to prune checkpoints in {directory}: {e}")
+
+
+def inputs_hash(inputs):
+    """Stable short hash of a run's inputs (key order independent)."""
+    canonical = json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class CheckpointStore:
+    """
+    Persists each completed task's output for one run, keyed by run id and inputs hash.
+
+    Files live at <directory>/<inputs_hash>/<run_id>.json and are rewritten atomically
+    after every task, so a crashed or failed run can be resumed from the first task
+    that has no checkpoint. Once the email has been delivered the file is kept with
+    its delivery record, as the durable marker that stops a resume sending it again,
+    until it is pruned after the retention window (see prune_checkpoints).
+    """
+
+    def __init__(self, inputs, run_id=None, directory=None):
+        self.inputs = inputs
+        self.inputs_hash = inputs_hash(inputs)
+        self.run_id = run_id or uuid.uuid4().hex
+        self.directory = Path(directory) if directory else checkpoint_dir()
+        self.path = self.directory / self.inputs_hash / f"{self.run_id}.json"
+        self._lock = threading.Lock()
+        self.data = {
+            "run_id": self.run_id,
+            "inputs_hash": self.inputs_hash,
+            "inputs": inputs,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "tasks": {},
+            "delivery": None,
+        }
+        if self.path.exists():
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+
+    @classmethod
+    def latest(cls, inputs, directory=None):
+        """
+        Return the most recently updated checkpoint for these inputs, or None.
+        """
+        directory = Path(directory) if directory else checkpoint_dir()
+        candidates = sorted(
+            (directory / inputs_hash(inputs)).glob("*.json"),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        if not candidates:
+            return None
+        return cls(inputs, run_id=candidates[0].stem, directory=directory)
+
+    def completed_tasks(self):
+        """Names of the leading tasks (in TASK_ORDER) that already have a checkpoint."""
+        completed = []
+        for task_name in TASK_ORDER:
+            if task_name not in self.data["tasks"]:
+                break
+            completed.append(task_name)
+        return completed
+
+    def next_task(self):
+        """Name of the first task without a checkpoint, or None if all tasks are done."""
+        completed = self.completed_tasks()
+        return TASK_ORDER[len(completed)] if len(completed) < len(TASK_ORDER) else None
+
+    def task_output(self, task_name):
+        return self.data["tasks"].get(task_name)
+
+    @property
+    def delivered(self):
+        return bool(self.data.get("delivery"))
+
+    def save_task_output(self, task_name, output):
+        """
+        Record a TaskOutput (raw text and, for structured tasks, its json_dict).
+        Ignored once the run is delivered: the delivered checkpoint is final.
+
+        Returns:
+            True if the output was checkpointed.
+        """
+        if task_name not in TASK_ORDER:
+            logger.warning(f"Not checkpointing unknown task '{task_name}'")
+            return False
+        json_dict = getattr(output, "json_dict", None)
+        with self._lock:
+            # Background delivery can mark the run delivered from another thread;
+            # checking under the lock keeps a late save from overtaking that write
+            if self.delivered:
+                logger.info(f"Run {self.run_id} is already delivered, not checkpointing {task_name} again")
+                return False
+            self.data["tasks"][task_name] = {
+                "raw": getattr(output, "raw", None) or str(output),
+                "json_dict": json_dict if isinstance(json_dict, dict) else None,
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._write()
+        logger.info(f"Checkpointed {task_name} for run {self.run_id} ({self.path})")
+        return True
+
+    def mark_delivered(self, results):
+        """
+        Record a successful delivery (or one handed to the outbox for replay). The run
+        is then complete; resuming it only returns the stored output and delivery results.
+        """
+        with self._lock:
+            self.data["delivery"] = {
+                "results": results,
+                "completed_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self._write()
+        logger.info(f"Marked run {self.run_id} as delivered ({self.path})")
+        _prune_now_and_then(self.directory)
+
+    def delivery_results(self):
+        return (self.data.get("delivery") or {}).get("results")
+
+    def discard(self):
+        with self._lock:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _write(self):
+        """Atomically rewrite the checkpoint file; the caller holds self._lock."""
+        self.data["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+DEFAULT_RECOVERY_SECONDS = float(os.environ.get("CIRCUIT_RECOVERY_SECONDS", "30"))
+# Per-host scrape breakers are created for every site researched; beyond this many,
+# the least recently used healthy ones are dropped so large batches stay bounded
+MAX_BREAKERS = int(os.environ.get("CIRCUIT_MAX_BREAKERS", "1024"))
+
+
+class CircuitOpenError(Exception):
+    """Raised by CircuitBreaker.call when the circuit is open and the call is rejected."""
+
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker.
+
+    closed:    calls go through; failure_threshold consecutive failures open the circuit.
+    open:      calls are rejected immediately for recovery_seconds.
+    half_open: up to half_open_max_calls probe calls are let through; a success closes
+               the circuit again, a failure reopens it for another recovery period.
+    """
+
+    def __init__(self, name, failure_threshold=None, recovery_seconds=None, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold or DEFAULT_FAILURE_THRESHOLD
+        self.recovery_seconds = recovery_seconds or DEFAULT_RECOVERY_SECONDS
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        # Counters exposed through snapshot()
+        self._successes = 0
+        self._failures = 0
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+            logger.info(f"Circuit '{self.name}' half-open, probing for recovery")
+
+    def allow_request(self):
+        """Return True if a call may proceed; every allowed call must be followed by record_success/record_failure."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._successes += 1
+            self._consecutive_failures = 0
+            if self._state != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed, dependency recovered")
+            self._state = CLOSED
+            self._half_open_in_flight = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._times_opened += 1
+                    logger.warning(
+                        f"Circuit '{self.name}' opened after {self._consecutive_failures} consecutive failure(s); "
+                        f"failing fast for {self.recovery_seconds}s"
+                    )
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_in_flight = 0
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker; any exception counts as a failure and is re-raised."""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._consecutive_failures,
+                "successes": self._successes,
+                "failures": self._failures,
+                "rejected": self._rejected,
+                "times_opened": self._times_opened,
+            }
+
+
+_breakers = OrderedDict()
+_breakers_lock = threading.Lock()
+
+
+def _evict_idle_breakers():
+    """Drop least recently used closed breakers without failures until under MAX_BREAKERS."""
+    for name in list(_breakers):
+        if len(_breakers) <= MAX_BREAKERS:
+            return
+        breaker = _breakers[name]
+        if breaker.state == CLOSED and breaker._consecutive_failures == 0:
+            del _breakers[name]
+
+
+def get_breaker(name, **options):
+    """Process-wide breaker for a dependency name, created on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **options)
+            if len(_breakers) > MAX_BREAKERS:
+                _evict_idle_breakers()
+        else:
+            _breakers.move_to_end(name)
+        return breaker
+
+
+def breaker_metrics():
+    """State and counters of every breaker created in this process."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
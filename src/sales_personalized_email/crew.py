@@ -1,15 +1,28 @@
-from crewai_tools import ScrapeWebsiteTool, SerperDevTool
 from pydantic import BaseModel
+import asyncio
+import httpx
 import requests
 from datetime import datetime, timezone
 import json
 import os
 import re
 import logging
+import time
 import traceback
+import uuid
 
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.agents.parser import AgentAction
+from crewai.project import CrewBase, agent, before_kickoff, crew, task
+from crewai.tasks.task_output import TaskOutput
+
+from sales_personalized_email.archive import archive_email, get_archive
+from sales_personalized_email.async_delivery import delivery_mode, get_delivery_service
+from sales_personalized_email.budgets import RunBudget, force_final_answer
+from sales_personalized_email.circuit_breaker import get_breaker
+from sales_personalized_email.prompts import load_config, validate_inputs
+from sales_personalized_email.outbox import append_to_outbox, replay_outbox
+from sales_personalized_email.tools.research_tools import ResilientScrapeWebsiteTool, ResilientSerperDevTool
 
 # It's better to get the logger configured in main.py or create a specific one for crew.py
 # For simplicity, let's try to use a basic configured logger here if needed.
@@ -26,13 +39,37 @@ if not logger.hasHandlers():
     logger.addHandler(handler)
     logger.propagate = False # Prevent duplicate messages if root logger is also configured by main.py
 
+STORE_EMAILS_BREAKER = "store-emails"
+
+# Agents in task order; the last one writes the email and may use the reserved run time
+AGENT_NAMES = ("prospect_researcher", "content_personalizer", "email_copywriter")
+
+# Opt-in delivery retries (EMAIL_API_MAX_RETRIES, default 0). store-emails POSTs are not
+# idempotent, so only responses that mean the request was not processed are retried:
+# 429 (throttled) and 503 (unavailable). 502/504 are not, as the insert may already
+# have happened behind the gateway. Retried requests reuse one Idempotency-Key header.
+RETRYABLE_STATUS_CODES = {429, 503}
+EMAIL_API_MAX_RETRIES = int(os.environ.get("EMAIL_API_MAX_RETRIES", "0"))
+EMAIL_API_RETRY_BACKOFF_SECONDS = float(os.environ.get("EMAIL_API_RETRY_BACKOFF_SECONDS", "1.0"))
+MAX_RETRY_DELAY_SECONDS = 10.0
+
+
+class EmailVariant(BaseModel):
+    variant_id: str
+    subject_line: str
+    email_body: str
+
+
 class PersonalizedEmail(BaseModel):
     subject_line: str
     email_body: str
     follow_up_notes: str
+    # All A/B variants written from the same research context; the top-level
+    # subject_line/email_body mirror the first variant.
+    variants: list[EmailVariant] = []
 
 
-def send_email_to_api(email_data, prospect_name, prospect_email):
+def send_email_to_api(email_data, prospect_name, prospect_email, variant_id=None):
     """
     Utility function to send email data to the external API
     
@@ -40,16 +77,27 @@ def send_email_to_api(email_data, prospect_name, prospect_email):
         email_data: The PersonalizedEmail object containing subject_line, email_body, and follow_up_notes
         prospect_name: The name of the prospect
         prospect_email: The email address of the prospect
+        variant_id: Optional A/B variant identifier, added to the payload when given
         
     Returns:
         API response information
     """
-    # Get API configuration from environment variables
-    api_url = os.environ.get("EMAIL_API_URL", "https://mycomputer.maziak.eu/api/v1/import/store-emails")
-    api_token = os.environ.get("EMAIL_API_TOKEN", "33f311ec174ef02f7c7ae27cd4cc52e3")
-    cf_client_id = os.environ.get("CF_ACCESS_CLIENT_ID", "3894d1511738c7ab1d79f04866bce72e.access")
-    cf_client_secret = os.environ.get("CF_ACCESS_CLIENT_SECRET", "d9cc6e4001d53f87f7dcdf3777e330d2781a9b866ef55ff222241b829166c510")
-    
+    # CPU time spent building (and logging) the payload, reported with the result
+    build_cpu_started = time.thread_time()
+    payload = build_email_payload(email_data, prospect_name, prospect_email, variant_id)
+    build_cpu_seconds = time.thread_time() - build_cpu_started
+    result = post_email_payload(payload)
+    result["build_cpu_seconds"] = round(build_cpu_seconds, 6)
+    return result
+
+
+def build_email_payload(email_data, prospect_name, prospect_email, variant_id=None):
+    """
+    Build the store-emails payload for an email (see send_email_to_api for the arguments).
+
+    Returns:
+        The payload dict, ready for post_email_payload or the async delivery service
+    """
     # Parse string to dict if needed
     if isinstance(email_data, str):
         try:
@@ -113,14 +161,6 @@ def send_email_to_api(email_data, prospect_name, prospect_email):
         subject = "Default Subject (extraction exception)"
         body = str(email_data)
         
-    # Prepare API call
-    headers = {
-        "CF-Access-Client-Id": cf_client_id,
-        "CF-Access-Client-Secret": cf_client_secret,
-        "Content-Type": "application/json",
-        "X-API-Token": api_token,
-    }
-    
     # Ensure body is properly encoded with no length limitations
     # Some APIs might silently truncate long JSON fields - ensure we use proper escaping
     body_encoded = body
@@ -135,9 +175,10 @@ def send_email_to_api(email_data, prospect_name, prospect_email):
             "date": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
         }
     }
+    if variant_id is not None:
+        payload["data"]["variant_id"] = variant_id
     
     try:
-        logger.info(f"Sending API request to {api_url}")
         logger.info(f"Payload: {json.dumps(payload, indent=2)}")
         
         # Debug the actual payload subject that will be sent
@@ -154,63 +195,350 @@ def send_email_to_api(email_data, prospect_name, prospect_email):
         payload_json = json.dumps(payload)
         logger.info(f"PAYLOAD JSON DEBUG - JSON length: {len(payload_json)}")
         logger.info(f"PAYLOAD JSON DEBUG - Preview: '{payload_json[:200]}...'")
+    except Exception as e:
+        logger.error(f"Error logging payload debug information: {e}")
+
+    return payload
+
+
+def email_api_config():
+    """
+    Return (api_url, headers) for the store-emails API from environment variables.
+    """
+    api_url = os.environ.get("EMAIL_API_URL", "https://mycomputer.maziak.eu/api/v1/import/store-emails")
+    api_token = os.environ.get("EMAIL_API_TOKEN", "33f311ec174ef02f7c7ae27cd4cc52e3")
+    cf_client_id = os.environ.get("CF_ACCESS_CLIENT_ID", "3894d1511738c7ab1d79f04866bce72e.access")
+    cf_client_secret = os.environ.get("CF_ACCESS_CLIENT_SECRET", "d9cc6e4001d53f87f7dcdf3777e330d2781a9b866ef55ff222241b829166c510")
+    headers = {
+        "CF-Access-Client-Id": cf_client_id,
+        "CF-Access-Client-Secret": cf_client_secret,
+        "Content-Type": "application/json",
+        "X-API-Token": api_token,
+    }
+    return api_url, headers
+
+
+def _retry_delay(response, attempts):
+    """Seconds to wait before the next attempt: the server's Retry-After if given, else exponential backoff."""
+    retry_after = response.headers.get("Retry-After")
+    try:
+        delay = float(retry_after) if retry_after else EMAIL_API_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    except ValueError:
+        delay = EMAIL_API_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    return min(delay, MAX_RETRY_DELAY_SECONDS)
+
+
+def _store_emails_failed(status_code):
+    """Responses that mean the store-emails dependency itself is unhealthy (for the circuit breaker)."""
+    return status_code == 429 or status_code >= 500
+
+
+def _circuit_open_result(payload, use_outbox, api_url):
+    """Result for a payload not sent because the store-emails circuit is open (parked in the outbox if use_outbox)."""
+    queued = use_outbox and append_to_outbox(payload, reason="store-emails circuit open")
+    error_message = f"Circuit for {api_url} is open, request not sent" + ("; queued to outbox" if queued else "")
+    logger.error(error_message)
+    return {
+        "status_code": 503,
+        "response_text": error_message,
+        "success": False,
+        "queued_to_outbox": bool(queued),
+    }
+
+
+def _delivery_handled(api_call_results):
+    """
+    True if every record was accepted by the API or parked in the outbox. A queued
+    record is sent by the outbox replay (resend_outbox), so resuming the run must
+    not send it again.
+    """
+    return all(result.get("success") or result.get("queued_to_outbox") for result in api_call_results)
+
+
+def _response_result(breaker, status_code, response_text, attempts):
+    """Record a store-emails response on the breaker and turn it into a result dict."""
+    if _store_emails_failed(status_code):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    if 200 <= status_code < 400:
+        logger.info(f"API response content: {response_text}")
+        return {
+            "status_code": status_code,
+            "response_text": response_text,
+            "success": True,
+            "attempts": attempts,
+        }
+    error_message = f"HTTP error: {status_code}. Response body: {response_text}"
+    logger.error(error_message)
+    return {
+        "status_code": status_code,
+        "response_text": error_message,
+        "success": False,
+        "attempts": attempts,
+    }
+
+
+def _request_error_result(breaker, status_code, error_message):
+    """Record a failed store-emails request (timeout, connection error, ...) and turn it into a result dict."""
+    breaker.record_failure()
+    logger.error(error_message)
+    return {
+        "status_code": status_code,
+        "response_text": error_message,
+        "success": False
+    }
+
+
+def post_email_payload(payload, use_outbox=True):
+    """
+    POST a prepared store-emails payload, guarded by the 'store-emails' circuit breaker.
+
+    While the circuit is open the request is not attempted at all; the payload is
+    parked in the outbox (see outbox.py) if use_outbox is set and a failed result
+    is returned immediately instead of waiting for another timeout.
+
+    Returns:
+        API response information
+    """
+    api_url, headers = email_api_config()
+    breaker = get_breaker(STORE_EMAILS_BREAKER)
+    if not breaker.allow_request():
+        return _circuit_open_result(payload, use_outbox, api_url)
+    headers = dict(headers, **{"Idempotency-Key": uuid.uuid4().hex}) # Same key for every attempt
+
+    try:
+        logger.info(f"Sending API request to {api_url}")
         
         # Use a different approach for the request to ensure full body is sent
         # First serialize to JSON with ensure_ascii=False to handle unicode properly
         payload_json_str = json.dumps(payload, ensure_ascii=False)
         logger.info(f"FINAL PAYLOAD DEBUG - Length: {len(payload_json_str)}")
         
-        # Make the request with the serialized JSON string
-        response = requests.post(
-            api_url,
-            headers=headers,
-            data=payload_json_str.encode('utf-8'),
-            timeout=30
-        )
-        logger.info(f"API response status: {response.status_code}")
-        
-        try:
-            response.raise_for_status()
-            response_content = response.text
-            logger.info(f"API response content: {response_content}")
-            return {
-                "status_code": response.status_code,
-                "response_text": response_content,
-                "success": True
-            }
-        except requests.exceptions.HTTPError as e:
-            error_message = f"HTTP error: {e}. Response body: {response.text}"
-            logger.error(error_message)
-            return {
-                "status_code": response.status_code,
-                "response_text": error_message,
-                "success": False
-            }
+        # Make the request with the serialized JSON string, retrying throttled (429)
+        # and transient gateway errors with exponential backoff
+        payload_bytes = payload_json_str.encode('utf-8')
+        attempts = 0
+        while True:
+            attempts += 1
+            response = requests.post(
+                api_url,
+                headers=headers,
+                data=payload_bytes,
+                timeout=30
+            )
+            logger.info(f"API response status: {response.status_code} (attempt {attempts})")
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempts > EMAIL_API_MAX_RETRIES:
+                break
+            delay = _retry_delay(response, attempts)
+            logger.warning(f"API returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return _response_result(breaker, response.status_code, response.text, attempts)
     except requests.exceptions.Timeout:
-        error_message = f"Request to {api_url} timed out after 30 seconds"
-        logger.error(error_message)
-        return {
-            "status_code": 408,
-            "response_text": error_message,
-            "success": False
-        }
+        return _request_error_result(breaker, 408, f"Request to {api_url} timed out after 30 seconds")
     except requests.exceptions.ConnectionError as e:
-        error_message = f"Connection error to {api_url}: {e}"
-        logger.error(error_message)
-        return {
-            "status_code": 503,
-            "response_text": error_message,
-            "success": False
-        }
+        return _request_error_result(breaker, 503, f"Connection error to {api_url}: {e}")
     except Exception as e:
-        error_message = f"Unexpected error sending to API: {str(e)}"
-        logger.error(error_message)
         traceback.print_exc()
-        return {
-            "status_code": 500,
-            "response_text": error_message,
-            "success": False
-        }
+        return _request_error_result(breaker, 500, f"Unexpected error sending to API: {str(e)}")
+
+
+async def post_email_payload_async(client, payload, use_outbox=True):
+    """
+    Coroutine counterpart of post_email_payload, for the background delivery loop
+    (see async_delivery.py): same circuit breaker, retries and outbox, sent with
+    client (the AsyncDeliveryService, or any httpx.AsyncClient) and backing off
+    with asyncio.sleep so other sends go on.
+
+    Returns:
+        API response information
+    """
+    api_url, headers = email_api_config()
+    breaker = get_breaker(STORE_EMAILS_BREAKER)
+    if not breaker.allow_request():
+        return _circuit_open_result(payload, use_outbox, api_url)
+    headers = dict(headers, **{"Idempotency-Key": uuid.uuid4().hex}) # Same key for every attempt
+
+    try:
+        payload_bytes = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        logger.info(f"Sending API request to {api_url} (async, {len(payload_bytes)} bytes)")
+        attempts = 0
+        while True:
+            attempts += 1
+            response = await client.post(api_url, headers=headers, content=payload_bytes, timeout=30)
+            logger.info(f"API response status: {response.status_code} (attempt {attempts})")
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempts > EMAIL_API_MAX_RETRIES:
+                break
+            delay = _retry_delay(response, attempts)
+            logger.warning(f"API returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        return _response_result(breaker, response.status_code, response.text, attempts)
+    except httpx.TimeoutException:
+        return _request_error_result(breaker, 408, f"Request to {api_url} timed out after 30 seconds")
+    except httpx.TransportError as e:
+        return _request_error_result(breaker, 503, f"Connection error to {api_url}: {e}")
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        return _request_error_result(breaker, 500, f"Unexpected error sending to API: {str(e)}")
+
+
+def replay_email_outbox():
+    """
+    Resend payloads parked in the outbox while the store-emails circuit was open.
+
+    Returns:
+        (sent, remaining) counts
+    """
+    return replay_outbox(lambda payload: post_email_payload(payload, use_outbox=False))
+
+
+def email_content(email_data):
+    """
+    Best-effort dict view (subject_line, email_body, follow_up_notes, variants) of a
+    write_email_task output, or None if it cannot be parsed.
+    """
+    content = None
+    if isinstance(getattr(email_data, 'json_dict', None), dict):
+        content = email_data.json_dict
+    elif isinstance(email_data, dict):
+        content = email_data
+    elif hasattr(email_data, 'model_dump'):
+        content = email_data.model_dump()
+    else:
+        raw = getattr(email_data, 'raw', email_data)
+        if isinstance(raw, str):
+            try:
+                content = json.loads(raw)
+            except json.JSONDecodeError:
+                return None
+    return content if isinstance(content, dict) else None
+
+
+def extract_email_variants(email_data):
+    """
+    Return the list of variant dicts (variant_id, subject_line, email_body) contained
+    in a write_email_task output, or an empty list if the output has no variants.
+    """
+    content = email_content(email_data)
+    if not content:
+        return []
+
+    variants = []
+    for index, variant in enumerate(content.get('variants') or []):
+        if hasattr(variant, 'model_dump'):
+            variant = variant.model_dump()
+        if not isinstance(variant, dict) or not variant.get('subject_line') or not variant.get('email_body'):
+            logger.warning(f"Skipping malformed email variant at index {index}: {str(variant)[:100]}")
+            continue
+        variants.append({
+            "variant_id": str(variant.get('variant_id') or chr(ord('A') + index)),
+            "subject_line": variant['subject_line'],
+            "email_body": variant['email_body'],
+        })
+    return variants
+
+
+def _delivery_records(email_data, prospect_email):
+    """
+    (email_data, variant_id, archived_email) for every record to send for a write_email_task output.
+
+    Outputs with a single (or no) variant are sent exactly as before, without a
+    variant_id, so the stored records stay unchanged for non A/B runs.
+    """
+    content = email_content(email_data) or {"email_body": str(email_data)}
+    variants = extract_email_variants(email_data)
+    if len(variants) <= 1:
+        return [(email_data, None, content)]
+    logger.info(f"Delivering {len(variants)} email variants for {prospect_email}")
+    return [
+        (variant, variant["variant_id"], dict(variant, follow_up_notes=content.get("follow_up_notes")))
+        for variant in variants
+    ]
+
+
+def deliver_email_variants(email_data, prospect_name, prospect_email, inputs=None, run_id=None, timings=None):
+    """
+    Send a write_email_task output to the API, one record per variant, and record
+    each one with its delivery status in the local email archive.
+
+    Args:
+        inputs, run_id, timings: optional run details stored alongside the email in the archive
+
+    Returns:
+        List of API response dicts, one per record sent, each with its variant_id
+        (None when the output has a single variant)
+    """
+    archive_inputs = inputs or {"name": prospect_name, "email_address": prospect_email}
+    api_call_results = []
+    for record_data, variant_id, archived_email in _delivery_records(email_data, prospect_email):
+        result = send_email_to_api(
+            email_data=record_data,
+            prospect_name=prospect_name,
+            prospect_email=prospect_email,
+            variant_id=variant_id,
+        )
+        result["variant_id"] = variant_id
+        archive_email(
+            archive_inputs, archived_email, variant_id=variant_id, run_id=run_id, timings=timings, delivery=result,
+        )
+        api_call_results.append(result)
+    return api_call_results
+
+
+def submit_email_variants(email_data, prospect_name, prospect_email, inputs=None, run_id=None, timings=None):
+    """
+    Non-blocking deliver_email_variants: the payloads are built on the calling thread,
+    then sent concurrently (and archived) by the background delivery loop.
+
+    Returns:
+        concurrent.futures.Future resolving to the list of API response dicts
+    """
+    archive_inputs = inputs or {"name": prospect_name, "email_address": prospect_email}
+    records = []
+    for record_data, variant_id, archived_email in _delivery_records(email_data, prospect_email):
+        build_cpu_started = time.thread_time()
+        payload = build_email_payload(record_data, prospect_name, prospect_email, variant_id)
+        records.append((payload, variant_id, archived_email, time.thread_time() - build_cpu_started))
+    return get_delivery_service().submit(_send_records, records, archive_inputs, run_id, timings)
+
+
+async def _send_records(service, records, archive_inputs, run_id, timings):
+    results = await asyncio.gather(*(post_email_payload_async(service, payload) for payload, _, _, _ in records))
+    for (_, variant_id, archived_email, build_cpu_seconds), result in zip(records, results):
+        result["build_cpu_seconds"] = round(build_cpu_seconds, 6)
+        result["variant_id"] = variant_id
+        # A local SQLite insert; short enough to run on the loop
+        archive_email(
+            archive_inputs, archived_email, variant_id=variant_id, run_id=run_id, timings=timings, delivery=result,
+        )
+    return list(results)
+
+
+def deliver_checkpointed_email(checkpoint, inputs, timings=None):
+    """
+    Deliver the write_email_task output stored in a checkpoint and mark the run
+    as delivered if every record was accepted or queued to the outbox. An email
+    the archive already records as delivered to this address is not sent again.
+
+    Returns:
+        (api_call_results, stored_output)
+    """
+    stored = checkpoint.task_output("write_email_task")
+    email_data = stored["json_dict"] or stored["raw"]
+    subject = (stored["json_dict"] or {}).get("subject_line")
+    archive = get_archive()
+    if subject and archive and archive.already_sent(inputs.get("email_address"), subject):
+        logger.info(f"Email '{subject}' was already delivered to {inputs.get('email_address')}, not sending it again")
+        api_call_results = [{"status_code": 200, "response_text": "already delivered", "success": True, "attempts": 0}]
+        checkpoint.mark_delivered(api_call_results)
+        return api_call_results, stored
+    api_call_results = deliver_email_variants(
+        email_data, inputs.get("name"), inputs.get("email_address"),
+        inputs=inputs, run_id=checkpoint.run_id, timings=timings,
+    )
+    if _delivery_handled(api_call_results):
+        checkpoint.mark_delivered(api_call_results)
+    return api_call_results, stored
 
 
 @CrewBase
@@ -220,14 +548,65 @@ class SalesPersonalizedEmailCrew:
     agents_config = "config/agents.yaml"
     tasks_config = "config/tasks.yaml"
     _crew_instance_inputs: dict = None # To store inputs for the callback
+    _checkpoint = None # CheckpointStore for the current run, if checkpointing is enabled
+    _single_task: bool = False # Only run the next incomplete task (used by the pipelined executor)
+    _defer_delivery: bool = False # Checkpoint the written email but leave delivery to the caller
+    _task_timings: dict = None # Seconds spent per task in the current run, for the email archive
+    _budget: RunBudget = None # Wall-clock / step budgets of the current run
+    _shared_budget: bool = False # _budget spans several kickoffs (pipeline stages) and is started by its owner
+    _delivery_results = None # store-emails results of the current run, or a Future of them with async delivery
+    _profiler = None # RunProfiler segmenting the run per task, when CREW_PROFILE is set
+
+    def __init__(self):
+        # CrewBase calls load_configurations() on every new instance (one per run, or per
+        # stage in the pipeline); serve the YAML parsed once per process instead
+        self.load_configurations = self._load_cached_configurations
+
+    def _load_cached_configurations(self):
+        self.agents_config = load_config("agent")
+        self.tasks_config = load_config("task")
+
+    def _run_budget(self):
+        if self._budget is None:
+            self._budget = RunBudget.from_env(AGENT_NAMES)
+        return self._budget
+
+    def _agent_options(self, agent_name):
+        """Budget-related Agent options: step callback and (if configured) max_iter."""
+        # A ReAct tool step (AgentAction) was already counted by the tool's budget_check;
+        # with native tool calling the callback only sees the final answer
+        options = {"step_callback": lambda step: self._enforce_budget(
+            agent_name, count_step=not isinstance(step, AgentAction),
+        )}
+        max_iter = self._run_budget().max_iter(agent_name)
+        if max_iter:
+            options["max_iter"] = max_iter
+        return options
+
+    def _enforce_budget(self, agent_name, count_step=True):
+        """
+        Count a step of agent_name against the budgets; once a budget is used up,
+        make the agent give its final answer with the information gathered so far.
+
+        Returns:
+            The reason the budget is exhausted, or None.
+        """
+        reason = self._run_budget().check(agent_name, last_agent=agent_name == AGENT_NAMES[-1], count_step=count_step)
+        if reason:
+            force_final_answer(getattr(self, agent_name)())
+        return reason
 
     @agent
     def prospect_researcher(self) -> Agent:
+        # The tools check the budget as well: with native tool calling the step
+        # callback only fires on the final answer, not on every tool call
+        budget_check = lambda: self._enforce_budget("prospect_researcher")
         return Agent(
             config=self.agents_config["prospect_researcher"],
-            tools=[SerperDevTool(), ScrapeWebsiteTool()],
+            tools=[ResilientSerperDevTool(budget_check=budget_check), ResilientScrapeWebsiteTool(budget_check=budget_check)],
             allow_delegation=False,
             verbose=True,
+            **self._agent_options("prospect_researcher"),
         )
 
     @agent
@@ -237,6 +616,7 @@ class SalesPersonalizedEmailCrew:
             tools=[],
             allow_delegation=False,
             verbose=True,
+            **self._agent_options("content_personalizer"),
         )
 
     @agent
@@ -246,6 +626,7 @@ class SalesPersonalizedEmailCrew:
             tools=[],
             allow_delegation=False,
             verbose=True,
+            **self._agent_options("email_copywriter"),
         )
 
     @task
@@ -272,34 +653,108 @@ class SalesPersonalizedEmailCrew:
             callback=self.store_email_callback
         )
 
+    @before_kickoff
+    def start_budget(self, inputs):
+        """Restart the run budget at every kickoff (train/test kick off one crew repeatedly)."""
+        if not self._shared_budget:
+            self._run_budget().start()
+        return inputs
+
     @crew
     def crew(self) -> Crew:
         """Creates the SalesPersonalizedEmail crew"""
+        self._task_timings = {}
+        self._timing_mark = time.monotonic()
         return Crew(
             agents=self.agents,  # Automatically created by the @agent decorator
-            tasks=self.tasks,  # Automatically created by the @task decorator
+            tasks=self._tasks_to_run(),  # Automatically created by the @task decorator
             process=Process.sequential,
             verbose=True,
+            task_callback=self.on_task_completed,
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
 
+    def _tasks_to_run(self):
+        """
+        All tasks, minus the ones already completed in the current checkpoint.
+        Every completed task gets its stored output restored, and each remaining task
+        gets all the tasks before it as context: in a regular sequential run a task
+        without explicit context sees the output of every earlier task.
+        With _single_task set (pipelined execution) only the next task is run.
+        """
+        tasks = self.tasks
+        completed = set(self._checkpoint.completed_tasks()) if self._checkpoint else set()
+        if completed:
+            remaining = [t for t in tasks if t.name not in completed]
+            done = [t for t in tasks if t.name in completed]
+            for task in done:
+                stored = self._checkpoint.task_output(task.name)
+                task.output = TaskOutput(
+                    name=task.name,
+                    description=task.description,
+                    expected_output=task.expected_output,
+                    raw=stored["raw"],
+                    json_dict=stored["json_dict"],
+                    agent=task.agent.role if task.agent else "",
+                )
+            # Outputs of tasks skipped here are not part of this crew's run, so
+            # crewai would not pass them on by itself
+            for position, task in enumerate(remaining):
+                task.context = done + remaining[:position]
+            logger.info(f"Resuming run {self._checkpoint.run_id}: skipping {[t.name for t in done]}, running {[t.name for t in remaining]}")
+            tasks = remaining
+        if self._single_task:
+            tasks = tasks[:1]
+        return tasks
+
+    def on_task_completed(self, output):
+        """Crew-level task callback: time and checkpoint every finished task."""
+        task_name = getattr(output, 'name', None)
+        if task_name and self._task_timings is not None and task_name not in self._task_timings:
+            now = time.monotonic()
+            self._task_timings[task_name] = round(now - self._timing_mark, 3)
+            self._timing_mark = now
+            self._run_budget().next_agent()
+            if self._profiler:
+                self._profiler.segment(task_name)
+        # store_email_callback checkpoints write_email_task before handing it to delivery;
+        # crewai's later call for the same task must not save it again
+        if self._checkpoint and task_name and self._checkpoint.task_output(task_name) is None:
+            try:
+                self._checkpoint.save_task_output(output.name, output)
+            except Exception as e:
+                logger.error(f"Failed to checkpoint task '{output.name}': {e}")
+
     def kickoff(self, inputs: dict | None = None):
         """
         Kicks off the crew execution with the provided inputs.
         Stores the inputs for use in callbacks.
         """
         effective_inputs = inputs if inputs is not None else {}
+        effective_inputs.setdefault("num_variants", 1)
+        validate_inputs(effective_inputs) # Fail before any agent spends tokens
         logger.info(f"SalesPersonalizedEmailCrew.kickoff called. Storing inputs (type: {type(effective_inputs)}): {effective_inputs}")
         self._crew_instance_inputs = effective_inputs
 
         # Now, get the actual CrewAI crew and kick it off
         crew_ai_crew_instance = self.crew() # This calls the @crew decorated method
-        return crew_ai_crew_instance.kickoff(inputs=effective_inputs)
+        result = crew_ai_crew_instance.kickoff(inputs=effective_inputs)
+        budget = self._run_budget().snapshot()
+        if budget["exhausted"]:
+            logger.warning(f"Run finished on a partial budget: {budget}")
+        return result
 
     def store_email_callback(self, output):
         """Callback to send email to API after task completion"""
         logger.warning(f"CALLBACK_ENTRY: store_email_callback INVOKED. Output type: {type(output)}")
         logger.info(f"CALLBACK: Received output (type: {type(output)}): {str(output)[:200]}...")
+
+        # Checkpoint the written email before delivery, so a failed delivery can be
+        # retried without writing the email again
+        self.on_task_completed(output)
+        if self._defer_delivery:
+            logger.info("CALLBACK: Delivery deferred to the caller, not sending to the API")
+            return output
         
         # Default fallback values
         prospect_name_default = "Unknown Prospect via Callback"
@@ -506,13 +961,35 @@ class SalesPersonalizedEmailCrew:
         
         logger.info(f"CALLBACK: Using final values: Name='{prospect_name}', Email='{prospect_email}'")
 
-        # Directly send the email to the API
-        api_call_result = send_email_to_api(
+        delivery = dict(
             email_data=output,
             prospect_name=prospect_name,
-            prospect_email=prospect_email
+            prospect_email=prospect_email,
+            inputs=self._crew_instance_inputs,
+            run_id=self._checkpoint.run_id if self._checkpoint else None,
+            timings=self._task_timings,
         )
-        logger.info(f"CALLBACK: API call result: {api_call_result}")
+        if delivery_mode() == "async":
+            # Hand the email (every variant) to the background delivery loop; the
+            # crew finishes without waiting for the API
+            self._delivery_results = submit_email_variants(**delivery)
+            self._delivery_results.add_done_callback(self._delivery_done)
+            logger.info("CALLBACK: Email submitted for background delivery")
+            return output
+
+        # Directly send the email (every variant) to the API
+        api_call_results = deliver_email_variants(**delivery)
+        self._delivery_results = api_call_results
+        self._record_delivery(api_call_results)
         
         # Still return the output
         return output
+
+    def _delivery_done(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self._record_delivery(future.result())
+
+    def _record_delivery(self, api_call_results):
+        logger.info(f"CALLBACK: API call results: {api_call_results}")
+        if self._checkpoint and _delivery_handled(api_call_results):
+            self._checkpoint.mark_delivered(api_call_results)
@@ -0,0 +1,201 @@
+"""
+Evaluation harness for prompt and model changes.
+
+Runs the crew for a fixture set of prospects (config/eval_prospects.jsonl by
+default), every prospect `iterations` times, concurrently on a worker pool.
+Delivery is deferred, so nothing is sent to the store-emails API. Every output is
+scored for PersonalizedEmail schema validity and the subject-line rule from
+agents.yaml (at most MAX_SUBJECT_WORDS words), and reported with latency and
+token usage.
+
+Usage: evaluate [fixtures.jsonl] [--iterations 2] [--workers 4] [--model gpt-4o-mini] [--out eval.jsonl]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from sales_personalized_email.crew import PersonalizedEmail, SalesPersonalizedEmailCrew, email_content
+from sales_personalized_email.ingest import iter_prospects
+from sales_personalized_email.prompts import PromptInputError, validate_inputs
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIXTURES = Path(__file__).parent / "config" / "eval_prospects.jsonl"
+DEFAULT_WORKERS = 4
+# agents.yaml: "The subject shall be ... about 10 words"; tasks.yaml: "not more than 10 words"
+MAX_SUBJECT_WORDS = 10
+
+TOKEN_FIELDS = ("total_tokens", "prompt_tokens", "completion_tokens", "successful_requests")
+
+
+def load_fixtures(path=None):
+    """Prospect inputs of the fixture file (invalid records are logged and skipped)."""
+    return [inputs for _, inputs in iter_prospects(path or DEFAULT_FIXTURES, validate=_check_fixture)]
+
+
+def _check_fixture(inputs):
+    inputs.setdefault("num_variants", 1)
+    try:
+        validate_inputs(inputs)
+    except PromptInputError as e:
+        return str(e)
+    return None
+
+
+def score_email(output):
+    """
+    Score one write_email_task output.
+
+    Returns:
+        Dict with schema_valid, subject_words, subject_ok (every subject line,
+        including the variants', within MAX_SUBJECT_WORDS) and errors.
+    """
+    content = email_content(output)
+    if content is None:
+        return {"schema_valid": False, "subject_words": None, "subject_ok": False, "errors": ["output is not JSON"]}
+    try:
+        email = PersonalizedEmail.model_validate(content)
+    except ValidationError as e:
+        return {
+            "schema_valid": False,
+            "subject_words": None,
+            "subject_ok": False,
+            "errors": [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()],
+        }
+    errors = []
+    subjects = [email.subject_line] + [variant.subject_line for variant in email.variants]
+    for subject in subjects:
+        words = len(subject.split())
+        if words > MAX_SUBJECT_WORDS:
+            errors.append(f"subject has {words} words: {subject!r}")
+    return {
+        "schema_valid": True,
+        "subject_words": len(email.subject_line.split()),
+        "subject_ok": not errors,
+        "errors": errors,
+    }
+
+
+def _token_usage(crew_result):
+    usage = getattr(crew_result, "token_usage", None)
+    return {field: int(getattr(usage, field, 0) or 0) for field in TOKEN_FIELDS}
+
+
+def run_case(inputs, iteration):
+    """Run the crew once for inputs without delivering, and score the email."""
+    started = time.monotonic()
+    record = {
+        "iteration": iteration,
+        "name": inputs.get("name"),
+        "company": inputs.get("company"),
+        "error": None,
+    }
+    try:
+        crew_manager = SalesPersonalizedEmailCrew()
+        crew_manager._defer_delivery = True
+        crew_result = crew_manager.kickoff(inputs=dict(inputs))
+        record.update(score_email(crew_result))
+        record["tokens"] = _token_usage(crew_result)
+        record["budget_exhausted"] = crew_manager._run_budget().snapshot()["exhausted"]
+    except Exception as e:
+        logger.error(f"Evaluation of {inputs.get('name')} (iteration {iteration}) failed: {e}")
+        record.update({"schema_valid": False, "subject_words": None, "subject_ok": False, "errors": [], "error": str(e)})
+        record["tokens"] = {field: 0 for field in TOKEN_FIELDS}
+    record["latency_seconds"] = round(time.monotonic() - started, 2)
+    return record
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def summarize(records, elapsed_seconds):
+    runs = len(records) or 1
+    latencies = sorted(record["latency_seconds"] for record in records)
+    tokens = {field: sum(record["tokens"][field] for record in records) for field in TOKEN_FIELDS}
+    return {
+        "runs": len(records),
+        "errors": sum(1 for record in records if record["error"]),
+        "schema_valid_rate": round(sum(record["schema_valid"] for record in records) / runs, 3),
+        "subject_ok_rate": round(sum(record["subject_ok"] for record in records) / runs, 3),
+        "budget_exhausted_runs": sum(1 for record in records if record.get("budget_exhausted")),
+        "latency_seconds": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "tokens": tokens,
+        "tokens_per_run": round(tokens["total_tokens"] / runs, 1),
+        "wall_seconds": round(elapsed_seconds, 2),
+    }
+
+
+def evaluate(prospects, iterations=1, workers=DEFAULT_WORKERS, out_path=None):
+    """
+    Run every prospect `iterations` times on a pool of `workers` threads.
+
+    Args:
+        prospects: list of prospect input dicts.
+        iterations: runs per prospect.
+        workers: concurrent crew runs.
+        out_path: optional JSONL file receiving one record per run as it finishes.
+
+    Returns:
+        Summary dict (quality rates, latency percentiles, token totals).
+    """
+    cases = [(inputs, iteration) for iteration in range(1, iterations + 1) for inputs in prospects]
+    logger.info(f"Evaluating {len(prospects)} prospect(s) x {iterations} iteration(s) on {workers} worker(s)")
+    records = []
+    out_lock = threading.Lock()
+    out = open(out_path, "w", encoding="utf-8") if out_path else None
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="evaluate") as pool:
+            futures = [pool.submit(run_case, inputs, iteration) for inputs, iteration in cases]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                logger.info(
+                    f"Evaluated {record['name']} #{record['iteration']}: schema_valid={record['schema_valid']} "
+                    f"subject_ok={record['subject_ok']} {record['latency_seconds']}s "
+                    f"{record['tokens']['total_tokens']} tokens ({len(records)}/{len(cases)})"
+                )
+                if out:
+                    with out_lock:
+                        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                        out.flush()
+    finally:
+        if out:
+            out.close()
+    return summarize(records, time.monotonic() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="evaluate", description="Evaluate the crew on a fixture set of prospects.")
+    parser.add_argument("fixtures", nargs="?", default=str(DEFAULT_FIXTURES), help="CSV/JSONL prospect fixtures")
+    parser.add_argument("--iterations", type=int, default=1, help="Runs per prospect")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent crew runs")
+    parser.add_argument("--model", default=None, help="LLM for the crew's agents (sets MODEL)")
+    parser.add_argument("--out", default=None, help="JSONL file for the per-run records")
+    args = parser.parse_args(argv)
+
+    if args.model:
+        os.environ["MODEL"] = args.model
+    summary = evaluate(load_fixtures(args.fixtures), args.iterations, args.workers, args.out)
+    if args.model:
+        summary["model"] = args.model
+    print(json.dumps(summary, indent=2))
+    return summary["errors"] == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Streaming prospect ingestion and result writing for large batches.
+
+Prospects are read lazily from CSV or JSONL and validated one at a time, and
+every finished prospect is written to a JSONL sink as a compact ProspectResult,
+so memory stays flat however many prospects a file holds.
+"""
+import csv
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# The prospect fields the Streamlit app requires before kicking off a run
+REQUIRED_FIELDS = ("name", "title", "company", "industry", "linkedin_url", "our_product", "email_address")
+
+# Accepted alternative column / key names for the prospect fields
+FIELD_ALIASES = {
+    "prospect_email": "email_address",
+    "email": "email_address",
+    "linkedin": "linkedin_url",
+    "product": "our_product",
+}
+
+
+def normalize_prospect(raw):
+    """Map aliased keys ("email", "Prospect Email", ...) to input names and strip string values."""
+    prospect = {}
+    for key, value in raw.items():
+        if key is None:
+            continue # Extra CSV cells without a header
+        field = str(key).strip().lower().replace(" ", "_")
+        field = FIELD_ALIASES.get(field, field)
+        prospect[field] = value.strip() if isinstance(value, str) else value
+    return prospect
+
+
+def missing_fields(prospect):
+    return [field for field in REQUIRED_FIELDS if not prospect.get(field)]
+
+
+def _read_records(path):
+    """Yield (line_number, raw_record) from a CSV, JSONL or (non-streaming) JSON list file."""
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2): # Line 1 is the header
+                yield line_number, row
+    elif path.endswith(".json"):
+        # A JSON list has to be loaded whole; use JSONL or CSV for large batches
+        with open(path, encoding="utf-8") as f:
+            for line_number, record in enumerate(json.load(f), start=1):
+                yield line_number, record
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+def iter_prospects(path, on_invalid=None, validate=None):
+    """
+    Lazily read and validate prospects from a .csv, .jsonl or .json file.
+
+    Args:
+        path: Prospect file.
+        on_invalid: optional callable(line_number, record, reason) for records that
+            are skipped because they are malformed or miss required fields.
+        validate: optional extra check, callable(record) returning the reason a
+            record is invalid or None.
+
+    Yields:
+        (line_number, prospect) for every valid record, in file order.
+    """
+    for line_number, record in _read_records(str(path)):
+        if not isinstance(record, dict):
+            reason = f"expected an object, got {type(record).__name__}"
+        else:
+            record = normalize_prospect(record)
+            missing = missing_fields(record)
+            reason = f"missing {', '.join(missing)}" if missing else None
+            if reason is None and validate:
+                reason = validate(record)
+        if reason is None:
+            yield line_number, record
+            continue
+        logger.warning(f"Skipping prospect on line {line_number} of {path}: {reason}")
+        if on_invalid:
+            on_invalid(line_number, record, reason)
+
+
+class ProspectResult:
+    """Outcome of one prospect, written to the result sink and then dropped."""
+
+    __slots__ = ("line", "email_address", "company", "status", "error", "elapsed_seconds", "deliveries")
+
+    def __init__(self, line, email_address, company, status, error=None, elapsed_seconds=None, deliveries=()):
+        self.line = line
+        self.email_address = email_address
+        self.company = company
+        self.status = status # "delivered", "failed" or "invalid"
+        self.error = error
+        self.elapsed_seconds = elapsed_seconds
+        self.deliveries = deliveries # ((variant_id, status_code, success), ...)
+
+    @classmethod
+    def from_delivery(cls, line, inputs, api_call_results, elapsed_seconds=None, error=None):
+        deliveries = tuple(
+            (result.get("variant_id"), result.get("status_code"), bool(result.get("success")))
+            for result in api_call_results or ()
+        )
+        delivered = api_call_results is not None and all(success for _, _, success in deliveries)
+        if not delivered and error is None:
+            error = "delivery failed" if api_call_results else "no email delivered"
+        return cls(
+            line, inputs.get("email_address"), inputs.get("company"),
+            "delivered" if delivered else "failed", error, elapsed_seconds, deliveries,
+        )
+
+    def to_dict(self):
+        return {
+            "line": self.line,
+            "email_address": self.email_address,
+            "company": self.company,
+            "status": self.status,
+            "success": self.status == "delivered",
+            "error": self.error,
+            "elapsed_seconds": self.elapsed_seconds,
+            "deliveries": [
+                {"variant_id": variant_id, "status_code": status_code, "success": success}
+                for variant_id, status_code, success in self.deliveries
+            ],
+        }
+
+
+class ResultSink:
+    """
+    Thread-safe JSONL writer for ProspectResults. Only counters are kept in
+    memory; every result is flushed as soon as it is written, so a crashed
+    batch still has the results of every finished prospect on disk.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = str(path)
+        self.counts = {"delivered": 0, "failed": 0, "invalid": 0}
+        self._lock = threading.Lock() # Pipeline workers finish prospects concurrently
+        self._file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, result):
+        line = json.dumps(result.to_dict(), ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.counts[result.status] += 1
+
+    def write_invalid(self, line_number, record, reason):
+        record = record if isinstance(record, dict) else {}
+        self.write(ProspectResult(line_number, record.get("email_address"), record.get("company"), "invalid", reason))
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_stream(prospects, sink, process):
+    """
+    Run process(inputs) for every (line_number, inputs) in prospects, one at a
+    time, and write each outcome to sink. Nothing per prospect outlives its turn,
+    except a delivery still in flight in the background.
+
+    Args:
+        prospects: iterable of (line_number, inputs), e.g. from iter_prospects.
+        sink: ResultSink receiving one ProspectResult per prospect.
+        process: callable(inputs) -> list of delivery result dicts, or a Future of
+            that list (async delivery); the next prospect starts without waiting
+            for it and its result is written when it completes.
+
+    Returns:
+        The sink's counters, once every background delivery has completed.
+    """
+    in_flight = set()
+    # Notified once a background delivery's result is written (Future waiters wake before its callbacks run)
+    written = threading.Condition()
+
+    def write(line_number, inputs, started, api_call_results, error):
+        sink.write(ProspectResult.from_delivery(
+            line_number, inputs, api_call_results, round(time.monotonic() - started, 2), error,
+        ))
+        if sink.total % 100 == 0:
+            logger.info(f"Progress: {sink.counts}")
+
+    def delivered(line_number, inputs, started, future):
+        try:
+            write(line_number, inputs, started, future.result(), None)
+        except Exception as e:
+            logger.error(f"Delivery for line {line_number} ({inputs.get('email_address')}) failed: {e}")
+            write(line_number, inputs, started, None, str(e))
+        with written:
+            in_flight.discard(future)
+            written.notify_all()
+
+    for line_number, inputs in prospects:
+        started = time.monotonic()
+        try:
+            api_call_results = process(inputs)
+            error = None
+        except Exception as e:
+            logger.error(f"Prospect on line {line_number} ({inputs.get('email_address')}) failed: {e}")
+            api_call_results, error = None, str(e)
+        if isinstance(api_call_results, Future):
+            with written:
+                in_flight.add(api_call_results)
+            api_call_results.add_done_callback(
+                lambda future, line_number=line_number, inputs=inputs, started=started:
+                    delivered(line_number, inputs, started, future)
+            )
+            continue
+        write(line_number, inputs, started, api_call_results, error)
+
+    with written:
+        if in_flight:
+            logger.info(f"Waiting for {len(in_flight)} background deliveries")
+        written.wait_for(lambda: not in_flight)
+    return dict(sink.counts)
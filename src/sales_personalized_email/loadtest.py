@@ -0,0 +1,294 @@
+"""
+Load-test harness for the send_email_to_api delivery path.
+
+Starts a local stand-in for the store-emails endpoint (configurable latency, error
+rate and 429 injection), points EMAIL_API_URL at it and drives send_email_to_api
+from a thread pool. Reports achieved records/s, latency percentiles, retries and
+the CPU time spent building payloads and emitting log records.
+
+With --async-delivery the records are instead handed to submit_email_variants from
+a single thread, the way the crew callback does, and sent by the background
+delivery loop over at most --concurrency connections; caller_blocked_ms then
+reports how long each hand-off kept the caller waiting.
+
+Usage: loadtest --records 2000 --concurrency 16 --body-bytes 2000 --latency-ms 50 --rate-429 0.02 [--async-delivery]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # The default backlog of 5 drops connections under load
+
+
+class StubStoreEmailsServer:
+    """Local HTTP stand-in for the store-emails API."""
+
+    def __init__(self, latency_ms=50.0, jitter_ms=10.0, error_rate=0.0, rate_429=0.0, retry_after=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.requests = 0
+        self.status_counts = {}
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-store-emails", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/import/store-emails"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                delay = max(0.0, random.gauss(stub.latency_ms, stub.jitter_ms)) / 1000
+                time.sleep(delay)
+                roll = random.random()
+                if roll < stub.rate_429:
+                    status, body = 429, b'{"error": "rate limited"}'
+                elif roll < stub.rate_429 + stub.error_rate:
+                    status, body = 500, b'{"error": "injected failure"}'
+                else:
+                    status, body = 200, b'{"status": "stored"}'
+                with stub._lock:
+                    stub.requests += 1
+                    stub.status_counts[status] = stub.status_counts.get(status, 0) + 1
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Keep the harness output readable
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class CpuTimingHandler(logging.Handler):
+    """Wraps a log handler and accumulates the thread CPU time spent handling records."""
+
+    def __init__(self, inner):
+        super().__init__(inner.level)
+        self.inner = inner
+        self.cpu_seconds = 0.0
+        self.records = 0
+        self._lock = threading.Lock()
+
+    def handle(self, record):
+        started = time.thread_time()
+        result = self.inner.handle(record)
+        elapsed = time.thread_time() - started
+        with self._lock:
+            self.cpu_seconds += elapsed
+            self.records += 1
+        return result
+
+
+def _instrument_logging(loggers, quiet):
+    """
+    Replace the handlers of the given loggers with CPU-timing wrappers. With quiet,
+    records are still formatted but written to os.devnull.
+
+    Returns:
+        (timing_handlers, restore) where restore() puts the original handlers back.
+    """
+    devnull = open(os.devnull, "w")
+    originals = {}
+    timing_handlers = []
+    for target in loggers:
+        originals[target] = list(target.handlers)
+        for handler in originals[target]:
+            inner = handler
+            if quiet and isinstance(handler, logging.StreamHandler):
+                inner = logging.StreamHandler(devnull)
+                inner.setFormatter(handler.formatter)
+                inner.setLevel(handler.level)
+            wrapper = CpuTimingHandler(inner)
+            target.removeHandler(handler)
+            target.addHandler(wrapper)
+            timing_handlers.append(wrapper)
+
+    def restore():
+        for target, handlers in originals.items():
+            for handler in list(target.handlers):
+                target.removeHandler(handler)
+            for handler in handlers:
+                target.addHandler(handler)
+        devnull.close()
+
+    return timing_handlers, restore
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load_test(records=1000, concurrency=16, body_bytes=2000, latency_ms=50.0, jitter_ms=10.0,
+                  error_rate=0.0, rate_429=0.0, quiet_logs=True, async_delivery=False, max_retries=2):
+    """
+    Drive send_email_to_api (or, with async_delivery, submit_email_variants) against
+    a local stub and return a report dict.
+    """
+    with StubStoreEmailsServer(latency_ms, jitter_ms, error_rate, rate_429) as stub:
+        os.environ["EMAIL_API_URL"] = stub.url
+        os.environ["EMAIL_OUTBOX_PATH"] = "" # Never divert load-test records to the real outbox
+        os.environ["EMAIL_ARCHIVE_PATH"] = ""
+        os.environ["EMAIL_API_MAX_CONNECTIONS"] = str(concurrency)
+
+        from sales_personalized_email import crew as crew_module
+        from sales_personalized_email.circuit_breaker import breaker_metrics, reset_breakers
+
+        reset_breakers()
+        crew_module.EMAIL_API_MAX_RETRIES = max_retries # Production default is 0 (EMAIL_API_MAX_RETRIES)
+        timing_handlers, restore_logging = _instrument_logging(
+            [logging.getLogger(), crew_module.logger], quiet_logs
+        )
+        body = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n" * (body_bytes // 56 + 1))[:body_bytes]
+
+        def email_data(n):
+            return {
+                "subject_line": f"Load test subject {n}",
+                "email_body": body,
+                "follow_up_notes": "load test",
+            }
+
+        def send_one(n):
+            started = time.perf_counter()
+            result = crew_module.send_email_to_api(email_data(n), f"Load Test {n}", f"loadtest+{n}@example.com")
+            return time.perf_counter() - started, result
+
+        def submit_all():
+            outcomes = []
+            finished = threading.Semaphore(0)
+
+            def done(future, started):
+                outcomes.append((time.perf_counter() - started, future.result()[0]))
+                finished.release()
+
+            for n in range(records):
+                started = time.perf_counter()
+                future = crew_module.submit_email_variants(email_data(n), f"Load Test {n}", f"loadtest+{n}@example.com")
+                blocked.append(time.perf_counter() - started)
+                future.add_done_callback(lambda future, started=started: done(future, started))
+            for _ in range(records):
+                finished.acquire()
+            return outcomes
+
+        blocked = []
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        try:
+            if async_delivery:
+                outcomes = submit_all()
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    outcomes = list(pool.map(send_one, range(records)))
+        finally:
+            restore_logging()
+        wall_seconds = time.perf_counter() - wall_started
+        process_cpu_seconds = time.process_time() - cpu_started
+
+    latencies = sorted(latency for latency, _ in outcomes)
+    results = [result for _, result in outcomes]
+    succeeded = sum(1 for result in results if result.get("success"))
+    build_cpu = sum(result.get("build_cpu_seconds", 0.0) for result in results)
+    logging_cpu = sum(handler.cpu_seconds for handler in timing_handlers)
+    status_codes = {}
+    for result in results:
+        status_codes[result["status_code"]] = status_codes.get(result["status_code"], 0) + 1
+
+    blocked.sort()
+    return {
+        "mode": "async" if async_delivery else "sync",
+        "records": records,
+        "concurrency": concurrency,
+        "body_bytes": body_bytes,
+        "wall_seconds": round(wall_seconds, 3),
+        "records_per_second": round(records / wall_seconds, 1) if wall_seconds else 0.0,
+        "succeeded": succeeded,
+        "failed": records - succeeded,
+        "retries": sum(max(0, result.get("attempts", 1) - 1) for result in results),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        "caller_blocked_ms": {
+            "p50": round(_percentile(blocked, 0.50) * 1000, 3),
+            "p99": round(_percentile(blocked, 0.99) * 1000, 3),
+        } if async_delivery else None,
+        "status_codes": status_codes,
+        "server_requests": stub.requests,
+        "server_status_codes": stub.status_counts,
+        "cpu_seconds": {
+            "process": round(process_cpu_seconds, 3),
+            "payload_build": round(build_cpu, 3),
+            "logging": round(logging_cpu, 3),
+            "payload_build_per_record_ms": round(build_cpu / records * 1000, 3) if records else 0.0,
+            "logging_per_record_ms": round(logging_cpu / records * 1000, 3) if records else 0.0,
+        },
+        "circuit_breakers": breaker_metrics(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="loadtest", description="Load-test the send_email_to_api delivery path.")
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--body-bytes", type=int, default=2000, help="Size of each email body")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean stub response latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Std deviation of the stub latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--max-retries", type=int, default=2, help="Delivery retries on 429/503 (EMAIL_API_MAX_RETRIES)")
+    parser.add_argument("--async-delivery", action="store_true",
+                        help="Hand records to the background delivery loop instead of sending from a thread pool")
+    parser.add_argument("--verbose-logs", action="store_true", help="Write delivery logs to stderr instead of discarding them")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        records=args.records,
+        concurrency=args.concurrency,
+        body_bytes=args.body_bytes,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_429=args.rate_429,
+        quiet_logs=not args.verbose_logs,
+        async_delivery=args.async_delivery,
+        max_retries=args.max_retries,
+    )
+    print(json.dumps(report, indent=2))
+    return report["failed"] == 0
+
+
+if __name__ == "__main__":
+    main()
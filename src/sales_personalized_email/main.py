@@ -1,14 +1,25 @@
 #!/usr/bin/env python
 import sys
+import argparse
 import requests
 import json
 import logging
+import time
 import traceback
 from datetime import datetime, timezone
 from typing import Optional
 import os
 
-from sales_personalized_email.crew import SalesPersonalizedEmailCrew, PersonalizedEmail, send_email_to_api
+from sales_personalized_email.crew import SalesPersonalizedEmailCrew, PersonalizedEmail, send_email_to_api, deliver_checkpointed_email, replay_email_outbox
+from sales_personalized_email.circuit_breaker import breaker_metrics
+from sales_personalized_email.archive import flush_archive, get_archive
+from sales_personalized_email.checkpoint import CheckpointStore, checkpoint_dir
+from sales_personalized_email.evaluation import load_fixtures, main as evaluation_main
+from sales_personalized_email.ingest import ProspectResult, ResultSink, iter_prospects, process_stream
+from sales_personalized_email.prompts import PromptInputError, validate_inputs
+from sales_personalized_email.profiling import PROFILE_MODES, profile_mode, profile_run
+from sales_personalized_email.pipeline import DEFAULT_QUEUE_SIZE, PipelineExecutor, parse_stage_workers
+from sales_personalized_email.sharding import merge_shard_outputs, run_shard, run_sharded_locally, split_prospects
 from crewai.crews.crew_output import CrewOutput
 
 print("========== MAIN.PY MODULE LOADED ==========")
@@ -29,11 +40,129 @@ logger = logging.getLogger("sales_email_agent")
 # interpolate any tasks and agents information
 
 
-def run(inputs_override: Optional[dict] = None):
+def _prepare_inputs(inputs):
+    """Fill in the inputs the crew needs but callers may omit. Modifies and returns inputs."""
+    # Ensure email_address is present in inputs
+    if "email_address" not in inputs:
+        logger.warning("'email_address' not found in inputs. Adding a placeholder for the API integration.")
+        print("Warning: 'email_address' not found in inputs. Adding a placeholder for the API integration.")
+        inputs["email_address"] = "placeholder@example.com"
+
+    # Number of A/B email variants written from the shared research context
+    if "num_variants" not in inputs:
+        inputs["num_variants"] = 1
+    return inputs
+
+
+def _check_prospect(inputs):
+    """
+    Submission-time check of one prospect: fills in the defaults (see _prepare_inputs)
+    and makes sure the inputs fill every prompt placeholder.
+
+    Returns:
+        The reason the prospect cannot be run, or None.
+    """
+    try:
+        validate_inputs(_prepare_inputs(inputs))
+    except PromptInputError as e:
+        return str(e)
+    return None
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _open_checkpoint(inputs, resume, run_id=None):
+    """
+    Return the CheckpointStore for this run, or None if checkpointing is disabled.
+    With resume, the checkpoint of run_id (or the latest one for these inputs) is reused.
+    """
+    if checkpoint_dir() is None:
+        return None
+    if resume:
+        checkpoint = CheckpointStore(inputs, run_id=run_id) if run_id else CheckpointStore.latest(inputs)
+        if checkpoint and checkpoint.completed_tasks():
+            logger.info(f"Resuming run {checkpoint.run_id} from {checkpoint.next_task() or 'delivery'}")
+            return checkpoint
+        logger.info("No checkpoint found for these inputs, starting from the first task.")
+    checkpoint = CheckpointStore(inputs, run_id=run_id)
+    checkpoint.discard() # A non-resumed run never reuses earlier task outputs or deliveries
+    checkpoint.data["tasks"] = {}
+    checkpoint.data["delivery"] = None
+    return checkpoint
+
+
+def _skip_delivered(prospects, resume):
+    """
+    On resume, drop the (line_number, inputs) prospects whose latest run was already
+    delivered; their result row was written by the earlier batch.
+    """
+    if not resume or checkpoint_dir() is None:
+        yield from prospects
+        return
+    for line_number, inputs in prospects:
+        checkpoint = CheckpointStore.latest(inputs)
+        if checkpoint and checkpoint.delivered:
+            logger.info(f"Skipping line {line_number} ({inputs.get('email_address')}): delivered by run {checkpoint.run_id}")
+            continue
+        yield line_number, inputs
+
+
+def _resume_delivery(checkpoint, inputs):
+    """
+    All tasks of a checkpointed run completed but delivery did not; deliver the stored email.
+
+    Returns:
+        (crew_output, api_call_results)
+    """
+    api_call_results, stored = deliver_checkpointed_email(checkpoint, inputs)
+    logger.info(f"Resumed delivery results: {api_call_results}")
+    return CrewOutput(raw=stored["raw"], json_dict=stored["json_dict"], tasks_output=[]), api_call_results
+
+
+def _kickoff(inputs, resume, run_id=None):
+    """
+    Run (or resume) the crew for prepared inputs.
+
+    With CREW_PROFILE set, the run is profiled per task (see profiling.py).
+
+    Returns:
+        (crew_result, api_call_results); api_call_results is None if nothing was delivered,
+        and a Future of the results while the email is sent in the background
+        (EMAIL_DELIVERY_MODE=async, see async_delivery.py).
+    """
+    checkpoint = _open_checkpoint(inputs, resume, run_id)
+    with profile_run(checkpoint.run_id if checkpoint else run_id) as profiler:
+        if checkpoint and checkpoint.delivered:
+            logger.info(f"Run {checkpoint.run_id} was already delivered, not running or sending it again")
+            stored = checkpoint.task_output("write_email_task")
+            crew_output = CrewOutput(raw=stored["raw"], json_dict=stored["json_dict"], tasks_output=[])
+            return crew_output, checkpoint.delivery_results()
+        if checkpoint and checkpoint.completed_tasks() and checkpoint.next_task() is None:
+            return _resume_delivery(checkpoint, inputs)
+
+        logger.info("Starting CrewAI workflow...")
+        print("Starting CrewAI workflow")
+        crew_manager = SalesPersonalizedEmailCrew()
+        crew_manager._crew_instance_inputs = inputs # Store inputs on the crew manager instance
+        crew_manager._checkpoint = checkpoint
+        crew_manager._profiler = profiler
+        actual_crew_to_run = crew_manager.crew()
+        crew_result = actual_crew_to_run.kickoff(inputs=inputs)
+        return crew_result, crew_manager._delivery_results
+
+
+def run(inputs_override: Optional[dict] = None, resume: Optional[bool] = None, run_id: Optional[str] = None):
     """
     Run the crew.
     If inputs_override is provided, it will be used instead of the hardcoded defaults.
     This allows the agentic runtime (or other callers) to pass in dynamic inputs.
+
+    Every task's output is checkpointed (see checkpoint.py). With resume=True (or the
+    CREW_RESUME environment variable) a previously failed run with the same inputs,
+    or the given run_id, continues from its first incomplete task.
+    Checkpoints are deleted once they are CHECKPOINT_RETENTION_SECONDS old (default 7 days).
     """
     print("=======================================")
     print("RUN FUNCTION CALLED")
@@ -58,18 +187,14 @@ def run(inputs_override: Optional[dict] = None):
             "email_address": "eleanor.vance.test@example.com",
         }
 
-    # Ensure email_address is present in inputs
-    if "email_address" not in inputs:
-        logger.warning("'email_address' not found in inputs. Adding a placeholder for the API integration.")
-        print("Warning: 'email_address' not found in inputs. Adding a placeholder for the API integration.")
-        inputs["email_address"] = "placeholder@example.com"
+    validate_inputs(_prepare_inputs(inputs)) # Fail before the crew starts
 
-    logger.info("Starting CrewAI workflow...")
-    print("Starting CrewAI workflow")
-    crew_manager = SalesPersonalizedEmailCrew()
-    crew_manager._crew_instance_inputs = inputs # Store inputs on the crew manager instance
-    actual_crew_to_run = crew_manager.crew()
-    crew_result = actual_crew_to_run.kickoff(inputs=inputs)
+    if resume is None:
+        resume = _env_flag("CREW_RESUME")
+    try:
+        crew_result, _ = _kickoff(inputs, resume, run_id)
+    finally:
+        flush_archive() # The agent runtime keeps the process alive, so atexit may never come
 
     logger.info(f"Crew execution result (type: {type(crew_result)})")
     print(f"Crew execution result (type: {type(crew_result)}):\n{crew_result}")
@@ -79,13 +204,186 @@ def run(inputs_override: Optional[dict] = None):
     return crew_result
 
 
+def _default_results_path(prospects_file):
+    stem, _, _ = prospects_file.rpartition(".")
+    return f"{stem or prospects_file}.results.jsonl"
+
+
+def _iter_inputs(prospects_file):
+    """Valid prospects of a file, without line numbers (invalid ones are logged and skipped)."""
+    return (inputs for _, inputs in iter_prospects(prospects_file, validate=_check_prospect))
+
+
+def batch():
+    """
+    Run the crew for every prospect in a CSV, JSONL or JSON file. Prospects are read
+    and validated lazily, and each outcome is streamed to a JSONL results file.
+    Usage: batch <prospects_file> [--results FILE] [--resume] [--profile cprofile|sample]
+                 [--pipeline [--workers research=4,write=2] [--queue-size N]]
+    """
+    parser = argparse.ArgumentParser(prog="batch", description="Run the crew for a file of prospects.")
+    parser.add_argument("prospects_file", help="CSV, JSONL or JSON list file of prospect inputs")
+    parser.add_argument("--results", default=None, help="JSONL results file (default: <prospects_file>.results.jsonl)")
+    parser.add_argument("--resume", action="store_true", help="Continue failed runs from their last completed task")
+    parser.add_argument("--pipeline", action="store_true", help="Overlap prospects across stages with per-stage worker pools")
+    parser.add_argument("--workers", default="", help="Pipeline worker pool sizes, e.g. research=4,personalize=2,write=2,deliver=2")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Pipeline queue capacity per stage")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=None, help="Profile every run (same as CREW_PROFILE)")
+    args = parser.parse_args(sys.argv[1:])
+    if args.profile:
+        os.environ["CREW_PROFILE"] = args.profile
+
+    results_path = args.results or _default_results_path(args.prospects_file)
+    try:
+        return _run_batch(args, results_path)
+    finally:
+        flush_archive() # Do not leave the last rows of the batch to the atexit close
+
+
+def _run_batch(args, results_path):
+    with ResultSink(results_path, append=args.resume) as sink:
+        # Resumed batches append to the results file, which already has the delivered prospects' rows
+        prospects = _skip_delivered(
+            iter_prospects(args.prospects_file, on_invalid=sink.write_invalid, validate=_check_prospect), args.resume,
+        )
+        if args.pipeline:
+            executor = PipelineExecutor(
+                stage_workers=parse_stage_workers(args.workers),
+                queue_size=args.queue_size,
+                resume=args.resume,
+                on_result=lambda item, api_call_results: sink.write(ProspectResult.from_delivery(
+                    item.index, item.inputs, api_call_results,
+                    round(time.monotonic() - item.started_at, 2), item.error,
+                )),
+            )
+            # Prospects overlap across worker threads, so the pipelined batch is profiled
+            # as a whole, by sampling (cProfile would only see the submitting thread)
+            mode = profile_mode()
+            if mode == "cprofile":
+                logger.warning("cProfile only sees the submitting thread of a pipelined batch; sampling all threads instead")
+                mode = "sample"
+            with profile_run(f"pipeline-{datetime.now().strftime('%Y%m%dT%H%M%S')}", mode=mode, last_segment="pipeline"):
+                report = executor.run(prospects)
+            report["invalid"] = sink.counts["invalid"]
+            print(json.dumps(report, indent=2))
+            logger.info(f"Results written to {results_path}")
+            return report["failed"] == 0 and report["invalid"] == 0
+
+        counts = process_stream(prospects, sink, lambda inputs: _kickoff(inputs, args.resume)[1])
+    logger.info(f"Batch finished: {counts}, results written to {results_path}")
+    logger.info(f"Circuit breakers: {breaker_metrics()}")
+    return counts["failed"] == 0 and counts["invalid"] == 0
+
+
+def shard():
+    """
+    Company-affinity sharding of a prospect file across processes or nodes.
+    Usage:
+      shard local <prospects_file> --shards N [--processes P] --out-dir DIR   split, run in a process pool, merge
+      shard split <prospects_file> --shards N --out-dir DIR                   emit per-node shard files
+      shard run <shard_file>                                                  process one shard file on a node
+      shard merge <out_dir>                                                   merge shard results and metrics
+    Exits with status 1 if any prospect failed or a shard crashed.
+    """
+    parser = argparse.ArgumentParser(prog="shard", description="Shard a prospect batch by company.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(command):
+        command.add_argument("--resume", action="store_true", help="Continue failed runs from their last completed task")
+        command.add_argument("--pipeline", action="store_true", help="Use the pipelined executor inside each shard")
+        command.add_argument("--workers", default="", help="Pipeline worker pool sizes, e.g. research=4,write=2")
+        command.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Pipeline queue capacity per stage")
+
+    local = commands.add_parser("local")
+    local.add_argument("prospects_file")
+    local.add_argument("--shards", type=int, required=True)
+    local.add_argument("--processes", type=int, default=None)
+    local.add_argument("--out-dir", default="shards")
+    add_run_options(local)
+    split = commands.add_parser("split")
+    split.add_argument("prospects_file")
+    split.add_argument("--shards", type=int, required=True)
+    split.add_argument("--out-dir", default="shards")
+    run_one = commands.add_parser("run")
+    run_one.add_argument("shard_file")
+    add_run_options(run_one)
+    merge = commands.add_parser("merge")
+    merge.add_argument("out_dir")
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.command == "split":
+        paths = split_prospects(_iter_inputs(args.prospects_file), args.shards, args.out_dir)
+        print("\n".join(str(path) for path in paths))
+        return True
+    if args.command == "merge":
+        metrics = merge_shard_outputs(args.out_dir)
+        print(json.dumps(metrics, indent=2))
+        return _shard_exit_status(metrics)
+
+    shard_options = {
+        "resume": args.resume,
+        "pipeline": args.pipeline,
+        "stage_workers": parse_stage_workers(args.workers),
+        "queue_size": args.queue_size,
+    }
+    if args.command == "run":
+        metrics = run_shard(args.shard_file, **shard_options)
+    else:
+        metrics = run_sharded_locally(
+            _iter_inputs(args.prospects_file), args.shards, args.out_dir,
+            processes=args.processes, **shard_options,
+        )
+    print(json.dumps(metrics, indent=2))
+    return _shard_exit_status(metrics)
+
+
+def _shard_exit_status(metrics):
+    """Process exit status for shard (the console script passes the return value to sys.exit)."""
+    if metrics["failed"] or metrics.get("crashed_shards") or metrics.get("crashed"):
+        logger.error(f"Sharded batch finished with {metrics['failed']} failed prospect(s)")
+        return 1
+    return 0
+
+
+def export_archive():
+    """
+    Export the local email archive (EMAIL_ARCHIVE_PATH) to Parquet, or Arrow IPC for .arrow files.
+    Usage: export_archive <out_file> [--since 2025-01-01]
+    """
+    parser = argparse.ArgumentParser(prog="export_archive", description="Export archived emails.")
+    parser.add_argument("out_file", help="Destination .parquet (or .arrow) file")
+    parser.add_argument("--since", default=None, help="Only export emails created at or after this ISO date")
+    args = parser.parse_args(sys.argv[1:])
+
+    archive = get_archive()
+    if archive is None:
+        raise SystemExit("Email archive is disabled (EMAIL_ARCHIVE_PATH is empty).")
+    exported = archive.export(args.out_file, since=args.since)
+    print(f"Exported {exported} email(s) to {args.out_file}")
+    return True
+
+
+def resend_outbox():
+    """
+    Resend emails parked in the outbox (EMAIL_OUTBOX_PATH) while the store-emails circuit was open.
+    """
+    sent, remaining = replay_email_outbox()
+    print(f"Outbox: {sent} sent, {remaining} still queued")
+    return remaining == 0
+
+
 def train():
     """
-    Train the crew for a given number of iterations.
+    Train the crew for a given number of iterations on the first evaluation fixture prospect.
+    Training asks for human feedback after every iteration, so iterations run one at a time.
+    Usage: train <n_iterations> <filename>
     """
-    inputs = {"topic": "AI LLMs"}
+    inputs = _prepare_inputs(load_fixtures()[0])
     try:
-        SalesPersonalizedEmailCrew().crew().train(
+        crew_manager = SalesPersonalizedEmailCrew()
+        crew_manager._crew_instance_inputs = inputs
+        crew_manager._defer_delivery = True # Never store training emails
+        crew_manager.crew().train(
             n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs
         )
 
@@ -106,16 +404,18 @@ def replay():
 
 def test():
     """
-    Test the crew execution and returns the results.
+    Evaluate the crew on the fixture prospects (see evaluation.py): every prospect runs
+    n_iterations times concurrently and is scored for schema validity and subject length.
+    Usage: test <n_iterations> [model]
     """
-    inputs = {"topic": "AI LLMs"}
+    argv = [f"--iterations={int(sys.argv[1]) if len(sys.argv) > 1 else 1}"]
+    if len(sys.argv) > 2:
+        argv.append(f"--model={sys.argv[2]}")
     try:
-        SalesPersonalizedEmailCrew().crew().test(
-            n_iterations=int(sys.argv[1]), openai_model_name=sys.argv[2], inputs=inputs
-        )
+        return evaluation_main(argv)
 
     except Exception as e:
-        raise Exception(f"An error occurred while replaying the crew: {e}")
+        raise Exception(f"An error occurred while testing the crew: {e}")
 
 
 def test_api():
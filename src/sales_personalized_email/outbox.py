@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_PATH = "email_outbox.jsonl"
+
+_outbox_lock = threading.Lock()
+
+
+def outbox_path():
+    """
+    Path of the delivery outbox, from EMAIL_OUTBOX_PATH.
+    Setting EMAIL_OUTBOX_PATH to an empty string disables the outbox.
+    """
+    return os.environ.get("EMAIL_OUTBOX_PATH", DEFAULT_OUTBOX_PATH) or None
+
+
+def append_to_outbox(payload, reason):
+    """
+    Park a store-emails payload that could not be sent (e.g. circuit open).
+
+    Returns:
+        True if the payload was written to the outbox.
+    """
+    path = outbox_path()
+    if not path:
+        return False
+    entry = {"queued_at": datetime.now(timezone.utc).isoformat(), "reason": reason, "payload": payload}
+    with _outbox_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    logger.warning(f"Queued email for {payload['data'].get('email')} to outbox {path}: {reason}")
+    return True
+
+
+def replay_outbox(post_payload):
+    """
+    Try to send every payload in the outbox again with post_payload(payload),
+    keeping only the ones that still fail.
+
+    Returns:
+        (sent, remaining) counts
+    """
+    path = outbox_path()
+    if not path or not os.path.exists(path):
+        return 0, 0
+    with _outbox_lock:
+        tmp_path = f"{path}.replaying"
+        os.replace(path, tmp_path)
+    sent = 0
+    failed_entries = []
+    with open(tmp_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            result = post_payload(entry["payload"])
+            if result.get("success"):
+                sent += 1
+            else:
+                failed_entries.append(entry)
+    with _outbox_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            for entry in failed_entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.remove(tmp_path)
+    logger.info(f"Outbox replay: {sent} sent, {len(failed_entries)} still queued")
+    return sent, len(failed_entries)
@@ -0,0 +1,324 @@
+import logging
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from sales_personalized_email.archive import flush_archive
+from sales_personalized_email.budgets import RunBudget
+from sales_personalized_email.checkpoint import CheckpointStore, checkpoint_dir
+from sales_personalized_email.circuit_breaker import breaker_metrics
+from sales_personalized_email.crew import AGENT_NAMES, SalesPersonalizedEmailCrew, deliver_checkpointed_email
+from sales_personalized_email.tools.research_tools import research_flights
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in order, and the crew task each one runs (delivery has no task)
+STAGES = ["research", "personalize", "write", "deliver"]
+STAGE_TASKS = {
+    "research": "research_prospect_task",
+    "personalize": "personalize_content_task",
+    "write": "write_email_task",
+}
+
+DEFAULT_STAGE_WORKERS = {"research": 4, "personalize": 2, "write": 2, "deliver": 2}
+DEFAULT_QUEUE_SIZE = 8
+QUEUE_SAMPLE_INTERVAL_SECONDS = 0.5
+
+_STOP = object() # Queue sentinel telling a stage worker to exit
+
+
+def parse_stage_workers(spec):
+    """
+    Parse a worker pool spec like "research=4,write=2" into a full stage -> workers dict.
+    Stages that are not mentioned keep their default size.
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        stage, _, count = part.partition("=")
+        stage = stage.strip()
+        if stage not in workers:
+            raise ValueError(f"Unknown pipeline stage '{stage}', expected one of {STAGES}")
+        workers[stage] = max(1, int(count))
+    return workers
+
+
+class PipelineItem:
+    """
+    One prospect travelling through the pipeline. Its RunBudget is shared by all
+    its stages, so the whole-run budget holds across them; it starts with the
+    first stage that runs and is paused while the prospect waits between stages.
+    """
+
+    __slots__ = ("index", "inputs", "checkpoint", "started_at", "error", "budget")
+
+    def __init__(self, index, inputs, checkpoint):
+        self.index = index
+        self.inputs = inputs
+        self.checkpoint = checkpoint
+        self.started_at = time.monotonic()
+        self.error = None
+        self.budget = None
+
+
+class StageStats:
+    """Counters for one stage, updated by its workers and the queue sampler."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.queue_depth_total = 0
+        self.queue_samples = 0
+        self.lock = threading.Lock()
+
+    def report(self, elapsed_seconds):
+        capacity = self.workers * elapsed_seconds
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            "avg_queue_depth": round(self.queue_depth_total / self.queue_samples, 2) if self.queue_samples else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class PipelineExecutor:
+    """
+    Runs prospects through research -> personalize -> write -> deliver with a separate
+    bounded queue and worker pool per stage, so different prospects occupy different
+    stages at the same time (prospect N+1 researching while N is being written).
+
+    Each task stage runs a single-task crew on top of the prospect's checkpoint, which
+    carries the previous stage's output forward as context. Failed prospects keep their
+    checkpoint and can be resumed later with resume=True.
+    """
+
+    def __init__(self, stage_workers=None, queue_size=DEFAULT_QUEUE_SIZE, resume=False, on_result=None):
+        """
+        Args:
+            stage_workers: dict of stage -> worker count (missing stages use the defaults)
+            queue_size: maximum number of prospects waiting in front of each stage
+            resume: continue prospects from their existing checkpoints
+            on_result: optional callable(item, api_call_results) invoked when a prospect
+                leaves the pipeline; api_call_results is None if the prospect failed
+        """
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+        self.queue_size = queue_size
+        self.resume = resume
+        self.on_result = on_result
+        self.queues = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES}
+        self.stats = {stage: StageStats(self.stage_workers[stage]) for stage in STAGES}
+        self.succeeded = 0
+        self.failed = 0
+        self.already_delivered = 0
+        self._result_lock = threading.Lock()
+        self._done_sampling = threading.Event()
+        self._checkpoint_dir = None # CHECKPOINT_DIR, or a temporary directory removed after run()
+
+    # --- Stage work ---
+
+    def _open_checkpoint(self, inputs):
+        if self.resume:
+            checkpoint = CheckpointStore.latest(inputs, directory=self._checkpoint_dir)
+            if checkpoint:
+                return checkpoint
+        return CheckpointStore(inputs, directory=self._checkpoint_dir)
+
+    def _run_task_stage(self, stage, item):
+        """Run the stage's crew task for one prospect. Returns False if already done."""
+        if STAGE_TASKS[stage] in item.checkpoint.completed_tasks():
+            return False
+        if item.budget is None:
+            item.budget = RunBudget.from_env(AGENT_NAMES)
+        else:
+            item.budget.resume() # Time spent queued between stages does not count
+        crew_manager = SalesPersonalizedEmailCrew()
+        crew_manager._budget = item.budget
+        crew_manager._shared_budget = True
+        crew_manager._crew_instance_inputs = item.inputs
+        crew_manager._checkpoint = item.checkpoint
+        crew_manager._single_task = True
+        crew_manager._defer_delivery = True
+        try:
+            crew_manager.crew().kickoff(inputs=item.inputs)
+        finally:
+            item.budget.pause()
+        if STAGE_TASKS[stage] not in item.checkpoint.completed_tasks():
+            raise RuntimeError(f"{STAGE_TASKS[stage]} finished without producing a checkpoint")
+        return True
+
+    def _run_deliver_stage(self, item):
+        api_call_results, _ = deliver_checkpointed_email(
+            item.checkpoint, item.inputs,
+            timings={"pipeline_seconds": round(time.monotonic() - item.started_at, 3)},
+        )
+        if not all(result.get("success") for result in api_call_results):
+            raise RuntimeError(f"Delivery failed: {api_call_results}")
+        return api_call_results
+
+    def _finish(self, item, api_call_results):
+        with self._result_lock:
+            if api_call_results is None:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+        if self.on_result:
+            try:
+                self.on_result(item, api_call_results)
+            except Exception as e:
+                logger.error(f"Pipeline on_result callback failed for prospect {item.index}: {e}")
+
+    def _worker(self, stage, next_stage, remaining_workers):
+        stats = self.stats[stage]
+        inbox = self.queues[stage]
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                break
+            started = time.monotonic()
+            api_call_results = None
+            try:
+                if stage == "deliver":
+                    api_call_results = self._run_deliver_stage(item)
+                    ran = True
+                else:
+                    ran = self._run_task_stage(stage, item)
+            except Exception as e:
+                item.error = f"{stage}: {e}"
+                logger.error(f"Pipeline: prospect {item.index} failed in stage '{stage}': {e}")
+                with stats.lock:
+                    stats.failed += 1
+                    stats.busy_seconds += time.monotonic() - started
+                self._finish(item, None)
+                continue
+            with stats.lock:
+                stats.busy_seconds += time.monotonic() - started
+                if ran:
+                    stats.processed += 1
+                else:
+                    stats.skipped += 1
+            if next_stage:
+                self.queues[next_stage].put(item) # Blocks while the next stage is saturated
+            else:
+                logger.info(f"Pipeline: prospect {item.index} delivered in {time.monotonic() - item.started_at:.1f}s")
+                self._finish(item, api_call_results)
+
+        # The last worker of a stage to exit shuts down the next stage
+        with remaining_workers["lock"]:
+            remaining_workers["count"] -= 1
+            last_worker = remaining_workers["count"] == 0
+        if last_worker and next_stage:
+            for _ in range(self.stage_workers[next_stage]):
+                self.queues[next_stage].put(_STOP)
+
+    def _sample_queues(self):
+        while not self._done_sampling.wait(QUEUE_SAMPLE_INTERVAL_SECONDS):
+            for stage in STAGES:
+                depth = self.queues[stage].qsize()
+                stats = self.stats[stage]
+                with stats.lock:
+                    stats.queue_depth_total += depth
+                    stats.queue_samples += 1
+                    stats.max_queue_depth = max(stats.max_queue_depth, depth)
+
+    # --- Entry point ---
+
+    def run(self, prospects):
+        """
+        Push every prospect through the pipeline and wait for all of them to finish.
+        prospects is consumed lazily and holds prepared input dicts, or (index, inputs)
+        pairs (e.g. file line numbers from ingest.iter_prospects) to number them by.
+
+        Returns:
+            Report dict with totals and per-stage utilization and queue depths.
+        """
+        started = time.monotonic()
+        temp_dir = None
+        self._checkpoint_dir = checkpoint_dir()
+        if self._checkpoint_dir is None:
+            temp_dir = self._checkpoint_dir = tempfile.mkdtemp(prefix="email-pipeline-")
+        try:
+            return self._run(prospects, started)
+        finally:
+            flush_archive()
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _run(self, prospects, started):
+        threads = []
+        for position, stage in enumerate(STAGES):
+            next_stage = STAGES[position + 1] if position + 1 < len(STAGES) else None
+            remaining_workers = {"count": self.stage_workers[stage], "lock": threading.Lock()}
+            for n in range(self.stage_workers[stage]):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, next_stage, remaining_workers),
+                    name=f"pipeline-{stage}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+        sampler = threading.Thread(target=self._sample_queues, name="pipeline-sampler", daemon=True)
+        sampler.start()
+
+        submitted = 0
+        for index, inputs in enumerate(prospects, start=1):
+            if isinstance(inputs, tuple):
+                index, inputs = inputs
+            checkpoint = self._open_checkpoint(inputs)
+            item = PipelineItem(index, inputs, checkpoint)
+            submitted += 1
+            if checkpoint.delivered:
+                # Resumed prospect an earlier run already delivered: report it, never re-send it
+                logger.info(f"Pipeline: prospect {index} already delivered by run {checkpoint.run_id}, skipping")
+                self.already_delivered += 1
+                self._finish(item, checkpoint.delivery_results())
+                continue
+            self.queues[STAGES[0]].put(item)
+        for _ in range(self.stage_workers[STAGES[0]]):
+            self.queues[STAGES[0]].put(_STOP)
+
+        for thread in threads:
+            thread.join()
+        self._done_sampling.set()
+        sampler.join()
+
+        elapsed = time.monotonic() - started
+        report = {
+            "submitted": submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "already_delivered": self.already_delivered,
+            "elapsed_seconds": round(elapsed, 2),
+            "prospects_per_minute": round(submitted / elapsed * 60, 2) if elapsed else 0.0,
+            "stages": {stage: self.stats[stage].report(elapsed) for stage in STAGES},
+            "circuit_breakers": breaker_metrics(),
+            "research_singleflight": research_flights.stats(),
+        }
+        log_report(report)
+        return report
+
+
+def log_report(report):
+    logger.info(
+        f"Pipeline finished: {report['succeeded']}/{report['submitted']} delivered, "
+        f"{report['failed']} failed in {report['elapsed_seconds']}s"
+    )
+    for stage, stats in report["stages"].items():
+        logger.info(
+            f"  {stage:<12} workers={stats['workers']:<3} processed={stats['processed']:<5} "
+            f"failed={stats['failed']:<4} utilization={stats['utilization']:.0%} "
+            f"queue avg={stats['avg_queue_depth']} max={stats['max_queue_depth']}"
+        )
+    logger.info(f"  research single-flight: {report['research_singleflight']}")
+    for name, breaker in report.get("circuit_breakers", {}).items():
+        if breaker["times_opened"] or breaker["state"] != "closed":
+            logger.info(f"  circuit {name}: {breaker}")
@@ -0,0 +1,305 @@
+"""
+Opt-in per-run profiling.
+
+Enabled with CREW_PROFILE (or `batch --profile`):
+    cprofile  deterministic cProfile of the thread running the crew, saved as .prof
+    sample    wall-clock sampling of all busy threads, saved as collapsed stacks
+              ("frame;frame;frame count" lines, the input format of flamegraph.pl / speedscope)
+
+Each run writes to <CREW_PROFILE_DIR>/<run_id>/ (default "profiles", run_id is the
+checkpoint / archive run id): one file per segment (the crew tasks, plus whatever
+runs after the last task, e.g. delivery), the whole run (run.prof / run.collapsed)
+and meta.json with segment timings. `profile_merge` aggregates any number of runs.
+"""
+import argparse
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_SAMPLE_INTERVAL_SECONDS = 0.005
+PROFILE_MODES = ("cprofile", "sample")
+
+# Stacks whose innermost frame is in one of these modules are threads waiting, not working
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "socket.py", "ssl.py")
+
+
+def profile_mode():
+    """Profiling mode from CREW_PROFILE ("1"/"true" mean cprofile), or None if disabled."""
+    value = os.environ.get("CREW_PROFILE", "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    if value in ("1", "true", "yes", "on"):
+        return "cprofile"
+    if value not in PROFILE_MODES:
+        logger.warning(f"Unknown CREW_PROFILE={value!r}, expected one of {PROFILE_MODES}; profiling disabled")
+        return None
+    return value
+
+
+def profile_dir():
+    return Path(os.environ.get("CREW_PROFILE_DIR", DEFAULT_PROFILE_DIR) or DEFAULT_PROFILE_DIR)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler:
+    """Samples the stacks of all threads from a background thread into collapsed-stack counts."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="crew-profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def take(self):
+        """Return the counts sampled since the last take()."""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id or os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(re.sub(r"-\d+$", "", names.get(thread_id, "thread"))) # Pool threads share a root
+                samples.append(";".join(reversed(stack)))
+            with self._lock:
+                self.counts.update(samples)
+
+
+class RunProfiler:
+    """
+    Profiles one crew run in segments. segment(name) closes the running segment
+    under that name and starts the next one; stop() closes the last one and writes
+    the whole-run files.
+    """
+
+    def __init__(self, mode, run_id, directory=None, interval=None):
+        self.mode = mode
+        self.run_id = run_id
+        self.directory = Path(directory or profile_dir()) / run_id
+        self.interval = interval or float(os.environ.get("CREW_PROFILE_INTERVAL", DEFAULT_SAMPLE_INTERVAL_SECONDS))
+        self.segments = []
+        self._profile = None
+        self._sampler = None
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._started_at = time.monotonic()
+        self.run_started_at = self._started_at
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = _StackSampler(self.interval)
+            self._sampler.start()
+        return self
+
+    def segment(self, name):
+        """Close the running segment as `name` and start profiling the next one."""
+        with self._lock:
+            if self._started_at is None:
+                return
+            now = time.monotonic()
+            filename = f"{len(self.segments) + 1:02d}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}"
+            if self.mode == "cprofile":
+                self._profile.disable()
+                self._profile.dump_stats(self.directory / f"{filename}.prof")
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                write_collapsed(self._sampler.take(), self.directory / f"{filename}.collapsed")
+            self.segments.append({"name": name, "file": filename, "seconds": round(now - self._started_at, 3)})
+            self._started_at = now
+
+    def stop(self, last_segment="after_tasks"):
+        """Close the last segment and write run.prof / run.collapsed and meta.json."""
+        self.segment(last_segment)
+        with self._lock:
+            if self.mode == "cprofile":
+                self._profile.disable()
+                merge_prof_files(
+                    [self.directory / f"{s['file']}.prof" for s in self.segments], self.directory / "run.prof"
+                )
+            else:
+                self._sampler.stop()
+                merge_collapsed_files(
+                    [self.directory / f"{s['file']}.collapsed" for s in self.segments], self.directory / "run.collapsed"
+                )
+            self._started_at = None
+        meta = {
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "seconds": round(time.monotonic() - self.run_started_at, 3),
+            "segments": self.segments,
+        }
+        (self.directory / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        logger.info(f"Profile of run {self.run_id} written to {self.directory}")
+
+
+@contextmanager
+def profile_run(run_id=None, mode=None, last_segment="after_tasks"):
+    """
+    Profile the enclosed block when profiling is enabled (mode, or CREW_PROFILE).
+    last_segment names whatever runs after the last segment() call.
+
+    Yields:
+        The RunProfiler, or None if profiling is disabled.
+    """
+    mode = mode or profile_mode()
+    if mode is None:
+        yield None
+        return
+    profiler = RunProfiler(mode, run_id or uuid.uuid4().hex).start()
+    try:
+        yield profiler
+    finally:
+        try:
+            profiler.stop(last_segment)
+        except Exception as e:
+            logger.error(f"Failed to write profile of run {profiler.run_id}: {e}")
+
+
+# --- Aggregation ---
+
+def write_collapsed(counts, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def read_collapsed(path, into=None):
+    counts = into if into is not None else Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                counts[stack] += int(count)
+    return counts
+
+
+def merge_collapsed_files(paths, out_path):
+    counts = Counter()
+    for path in paths:
+        read_collapsed(path, counts)
+    write_collapsed(counts, out_path)
+    return counts
+
+
+def merge_prof_files(paths, out_path):
+    paths = [str(path) for path in paths]
+    if not paths:
+        return None
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    stats.dump_stats(str(out_path))
+    return stats
+
+
+def _top_self_time(counts, limit):
+    """Report lines for the frames with the most samples at the top of the stack."""
+    total = sum(counts.values()) or 1
+    leaves = Counter()
+    for stack, count in counts.items():
+        leaves[stack.rpartition(";")[2]] += count
+    lines = [f"{'samples':>9} {'self %':>7}  frame"]
+    for frame, count in leaves.most_common(limit):
+        lines.append(f"{count:>9} {count / total:>7.1%}  {frame}")
+    return "\n".join(lines)
+
+
+def _run_files(inputs, pattern):
+    """run.* files under the given run directories / profile roots, or the files themselves."""
+    for item in map(Path, inputs):
+        if item.is_dir():
+            yield from sorted(item.rglob(pattern))
+        elif item.exists():
+            yield item
+
+
+def main():
+    """
+    Merge the profiles of many runs into one report.
+    Usage: profile_merge [profiles/ | profiles/<run_id> ...] [--out-dir merged] [--top 40] [--segments]
+    """
+    parser = argparse.ArgumentParser(prog="profile_merge", description="Aggregate per-run crew profiles.")
+    parser.add_argument("inputs", nargs="*", default=[str(profile_dir())], help="Profile roots, run directories or files")
+    parser.add_argument("--out-dir", default="merged_profile", help="Where to write the merged files")
+    parser.add_argument("--top", type=int, default=40, help="Number of entries in the text report")
+    parser.add_argument("--segments", action="store_true",
+                        help="Merge per-task segment files into one file per task instead of whole runs")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    groups = {}
+    if args.segments:
+        for path in _run_files(args.inputs, "[0-9][0-9]-*.*"):
+            segment = path.stem.split("-", 1)[-1]
+            groups.setdefault((segment, path.suffix), []).append(path)
+    else:
+        for path in _run_files(args.inputs, "run.*"):
+            groups.setdefault(("all_runs", path.suffix), []).append(path)
+
+    report = io.StringIO()
+    for (name, suffix), paths in sorted(groups.items()):
+        if suffix == ".prof":
+            stats = merge_prof_files(paths, out_dir / f"{name}.prof")
+            report.write(f"=== {name}: {len(paths)} cProfile file(s) ===\n")
+            stats.stream = report
+            stats.sort_stats("cumulative").print_stats(args.top)
+            stats.sort_stats("tottime").print_stats(args.top)
+        elif suffix == ".collapsed":
+            counts = merge_collapsed_files(paths, out_dir / f"{name}.collapsed")
+            report.write(f"=== {name}: {len(paths)} sampled profile(s), {sum(counts.values())} samples ===\n")
+            report.write(_top_self_time(counts, args.top) + "\n\n")
+    if not groups:
+        print(f"No profiles found in {args.inputs}")
+        return False
+    (out_dir / "report.txt").write_text(report.getvalue(), encoding="utf-8")
+    print(report.getvalue())
+    print(f"Merged profiles written to {out_dir}")
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+agents.yaml / tasks.yaml loaded once per process, plus the placeholders their prompts use.
+
+crewai still interpolates every prompt at kickoff; the placeholders are extracted
+up front only so a prospect's inputs can be checked at submission time (main.run,
+batch, shard, evaluate) instead of failing inside a crew kickoff after the
+research agent has already spent tokens.
+"""
+import copy
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import yaml
+
+CONFIG_DIR = Path(__file__).parent / "config"
+CONFIG_FILES = {"agent": "agents.yaml", "task": "tasks.yaml"}
+
+# Same placeholder syntax crewai interpolates: {name}, but not JSON like {'website_url': ...}
+PLACEHOLDER_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_\-]*)}")
+
+# Input value types crewai accepts for interpolation
+_RENDERABLE_TYPES = (str, int, float, bool, dict, list)
+
+
+class PromptInputError(ValueError):
+    """Raised when a run's inputs cannot fill the prompt templates."""
+
+    def __init__(self, missing=(), invalid=()):
+        self.missing = list(missing)
+        self.invalid = list(invalid)
+        problems = []
+        if self.missing:
+            problems.append(f"missing {', '.join(self.missing)}")
+        if self.invalid:
+            problems.append(f"unsupported value type for {', '.join(self.invalid)}")
+        super().__init__(f"Invalid crew inputs: {'; '.join(problems)}")
+
+
+class PromptTemplate:
+    """One YAML prompt string and the placeholder names it uses."""
+
+    __slots__ = ("text", "placeholders")
+
+    def __init__(self, text):
+        self.text = text
+        self.placeholders = tuple(dict.fromkeys(PLACEHOLDER_PATTERN.findall(text)))
+
+
+@lru_cache(maxsize=None)
+def _load_yaml(kind):
+    with open(CONFIG_DIR / CONFIG_FILES[kind], encoding="utf-8") as f:
+        content = yaml.safe_load(f)
+    return content if isinstance(content, dict) else {}
+
+
+def load_config(kind):
+    """
+    Fresh copy of the parsed agents ("agent") or tasks ("task") YAML. The file is only
+    read once per process; callers get a copy because crewai adds objects to it.
+    """
+    return copy.deepcopy(_load_yaml(kind))
+
+
+@lru_cache(maxsize=None)
+def templates():
+    """
+    Returns:
+        {(kind, entry_name, field): PromptTemplate} for every string field of every agent and task.
+    """
+    compiled = {}
+    for kind in CONFIG_FILES:
+        for entry_name, entry in _load_yaml(kind).items():
+            for field, value in (entry or {}).items():
+                if isinstance(value, str):
+                    compiled[(kind, entry_name, field)] = PromptTemplate(value)
+    return compiled
+
+
+@lru_cache(maxsize=None)
+def required_placeholders():
+    """Every placeholder used by the agents' and tasks' prompts."""
+    return frozenset(name for template in templates().values() for name in template.placeholders)
+
+
+def input_errors(inputs):
+    """
+    Check inputs against the required placeholders.
+
+    Returns:
+        (missing, invalid) lists of input names; both empty if the inputs are usable.
+    """
+    missing = sorted(name for name in required_placeholders() if inputs.get(name) in (None, ""))
+    invalid = sorted(
+        name for name in required_placeholders()
+        if name not in missing and not isinstance(inputs[name], _RENDERABLE_TYPES)
+    )
+    return missing, invalid
+
+
+def validate_inputs(inputs):
+    """Raise PromptInputError if inputs cannot fill every prompt template."""
+    missing, invalid = input_errors(inputs)
+    if missing or invalid:
+        raise PromptInputError(missing, invalid)
+
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Mailbox providers whose domain says nothing about the prospect's company
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "yahoo.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "example.com",
+}
+
+# Legal-form suffixes dropped so "Acme Corp." and "ACME Corporation" share a shard
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc",
+    "plc", "gmbh", "ag", "sa", "sas", "srl", "bv", "nv", "oy", "ab", "as", "sro", "group", "holdings",
+}
+
+SHARD_FILE_PATTERN = "shard-{:03d}.jsonl"
+# Everything split_prospects / run_shard / merge_shard_outputs write into out_dir
+SHARD_OUTPUT_GLOBS = ("shard-*.jsonl", "shard-*.metrics.json", "results.jsonl", "metrics.json")
+
+
+def company_key(inputs):
+    """
+    Normalized company identity of a prospect: the corporate email domain when there
+    is one, otherwise the company name without punctuation and legal-form suffixes.
+    """
+    email = str(inputs.get("email_address") or inputs.get("email") or "").strip().lower()
+    domain = email.rpartition("@")[2]
+    if domain and domain not in FREE_MAIL_DOMAINS:
+        return domain.removeprefix("www.")
+    words = re.sub(r"[^a-z0-9]+", " ", str(inputs.get("company") or "").lower()).split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words) or email
+
+
+def jump_consistent_hash(key, num_buckets):
+    """
+    Jump consistent hash (Lamping & Veach): maps a 64-bit key to a bucket so that
+    growing from N to N+1 buckets only moves ~1/(N+1) of the keys.
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_for(inputs, num_shards):
+    digest = hashlib.blake2b(company_key(inputs).encode("utf-8"), digest_size=8).digest()
+    return jump_consistent_hash(int.from_bytes(digest, "big"), num_shards)
+
+
+def split_prospects(prospects, num_shards, out_dir):
+    """
+    Stream prospects into per-shard JSONL files (one file per process or node).
+    Shard files and outputs of an earlier split in out_dir are removed first, so
+    a later merge never picks up shards of a run with a different shard count.
+
+    Returns:
+        List of shard file paths, indexed by shard number.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stale = [path for pattern in SHARD_OUTPUT_GLOBS for path in out_dir.glob(pattern)]
+    for path in stale:
+        path.unlink()
+    if stale:
+        logger.info(f"Removed {len(stale)} shard file(s) of an earlier run from {out_dir}")
+    paths = [out_dir / SHARD_FILE_PATTERN.format(n) for n in range(num_shards)]
+    files = [path.open("w", encoding="utf-8") for path in paths]
+    counts = [0] * num_shards
+    try:
+        for inputs in prospects:
+            shard = shard_for(inputs, num_shards)
+            files[shard].write(json.dumps(inputs, ensure_ascii=False) + "\n")
+            counts[shard] += 1
+    finally:
+        for f in files:
+            f.close()
+    logger.info(f"Split prospects into {num_shards} shards: {counts}")
+    return paths
+
+
+def shard_output_paths(shard_path):
+    shard_path = Path(shard_path)
+    stem = shard_path.name.removesuffix(".jsonl")
+    return shard_path.with_name(f"{stem}.results.jsonl"), shard_path.with_name(f"{stem}.metrics.json")
+
+
+def run_shard(shard_path, resume=False, pipeline=False, stage_workers=None, queue_size=None):
+    """
+    Process one shard file with main.run (or the pipelined executor) and write
+    <shard>.results.jsonl and <shard>.metrics.json next to it. Runs in a worker
+    process locally, or directly on a node for an emitted shard file.
+    """
+    from sales_personalized_email import main as entry
+    from sales_personalized_email.archive import flush_archive
+    from sales_personalized_email.circuit_breaker import breaker_metrics
+    from sales_personalized_email.ingest import ProspectResult, ResultSink, iter_prospects, process_stream
+    from sales_personalized_email.pipeline import DEFAULT_QUEUE_SIZE, PipelineExecutor
+
+    results_path, metrics_path = shard_output_paths(shard_path)
+    started = time.monotonic()
+    metrics = {"shard": Path(shard_path).name}
+
+    # Shard results are rewritten on every run: with resume, prospects already delivered
+    # get their row from the stored delivery results (main._kickoff) without being re-sent
+    try:
+        with ResultSink(results_path) as sink:
+            prospects = iter_prospects(shard_path, on_invalid=sink.write_invalid, validate=entry._check_prospect)
+            if pipeline:
+                executor = PipelineExecutor(
+                    stage_workers=stage_workers,
+                    queue_size=queue_size or DEFAULT_QUEUE_SIZE,
+                    resume=resume,
+                    on_result=lambda item, api_call_results: sink.write(ProspectResult.from_delivery(
+                        item.index, item.inputs, api_call_results,
+                        round(time.monotonic() - item.started_at, 2), item.error,
+                    )),
+                )
+                metrics["pipeline"] = executor.run(prospects)
+            else:
+                process_stream(prospects, sink, lambda inputs: entry._kickoff(inputs, resume)[1])
+            metrics["submitted"] = sink.total
+            metrics["succeeded"] = sink.counts["delivered"]
+            metrics["failed"] = sink.counts["failed"] + sink.counts["invalid"]
+    finally:
+        flush_archive() # Pool workers exit without running atexit
+
+    metrics["elapsed_seconds"] = round(time.monotonic() - started, 2)
+    metrics["circuit_breakers"] = breaker_metrics()
+    metrics_path.write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+    return metrics
+
+
+def record_crashed_shard(shard_path, error):
+    """
+    Write <shard>.metrics.json for a shard whose worker crashed: every prospect of
+    the shard without a delivered result counts as failed.
+    """
+    results_path, metrics_path = shard_output_paths(shard_path)
+    with open(shard_path, encoding="utf-8") as f:
+        submitted = sum(1 for line in f if line.strip())
+    succeeded = 0
+    if results_path.exists():
+        with results_path.open(encoding="utf-8") as f:
+            succeeded = sum(1 for line in f if line.strip() and json.loads(line).get("status") == "delivered")
+    metrics = {
+        "shard": Path(shard_path).name,
+        "submitted": submitted,
+        "succeeded": succeeded,
+        "failed": max(0, submitted - succeeded),
+        "crashed": str(error),
+    }
+    metrics_path.write_text(json.dumps(metrics, indent=2), encoding="utf-8")
+    return metrics
+
+
+def merge_shard_outputs(out_dir):
+    """
+    Concatenate all shard result files into results.jsonl and combine the shard
+    metrics into metrics.json in out_dir.
+
+    Returns:
+        The merged metrics dict.
+    """
+    out_dir = Path(out_dir)
+    merged = {
+        "shards": 0, "submitted": 0, "succeeded": 0, "failed": 0, "crashed_shards": 0,
+        "elapsed_seconds": 0.0, "per_shard": [],
+    }
+    with (out_dir / "results.jsonl").open("w", encoding="utf-8") as results:
+        for results_path in sorted(out_dir.glob("shard-*.results.jsonl")):
+            with results_path.open(encoding="utf-8") as f:
+                for line in f:
+                    results.write(line)
+    for metrics_path in sorted(out_dir.glob("shard-*.metrics.json")):
+        metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+        merged["shards"] += 1
+        merged["crashed_shards"] += 1 if metrics.get("crashed") else 0
+        for key in ("submitted", "succeeded", "failed"):
+            merged[key] += metrics.get(key, 0)
+        # Shards run in parallel, so the batch takes as long as the slowest shard
+        merged["elapsed_seconds"] = max(merged["elapsed_seconds"], metrics.get("elapsed_seconds", 0.0))
+        merged["per_shard"].append({k: v for k, v in metrics.items() if k not in ("pipeline", "circuit_breakers")})
+        for name, breaker in metrics.get("circuit_breakers", {}).items():
+            totals = merged.setdefault("circuit_breakers", {}).setdefault(
+                name, {"successes": 0, "failures": 0, "rejected": 0, "times_opened": 0}
+            )
+            for key in totals:
+                totals[key] += breaker.get(key, 0)
+    if merged["elapsed_seconds"]:
+        merged["prospects_per_minute"] = round(merged["submitted"] / merged["elapsed_seconds"] * 60, 2)
+    (out_dir / "metrics.json").write_text(json.dumps(merged, indent=2), encoding="utf-8")
+    logger.info(f"Merged {merged['shards']} shards: {merged['succeeded']}/{merged['submitted']} succeeded")
+    return merged
+
+
+def run_sharded_locally(prospects, num_shards, out_dir, processes=None, **shard_options):
+    """
+    Split prospects by company affinity, process every shard in its own worker
+    process, then merge the results. Prospects of one company always land in the
+    same process, so that process's research and company caches stay warm.
+    """
+    shard_paths = split_prospects(prospects, num_shards, out_dir)
+    with ProcessPoolExecutor(max_workers=processes or num_shards) as pool:
+        futures = {pool.submit(run_shard, path, **shard_options): path for path in shard_paths}
+        for future in as_completed(futures):
+            try:
+                metrics = future.result()
+                logger.info(f"Shard {metrics['shard']} finished: {metrics['succeeded']}/{metrics['submitted']} succeeded")
+            except Exception as e:
+                metrics = record_crashed_shard(futures[future], e)
+                logger.error(f"Shard {futures[future]} crashed, counting {metrics['failed']} prospect(s) as failed: {e}")
+    return merge_shard_outputs(out_dir)
@@ -0,0 +1,107 @@
+import json
+import logging
+from typing import Callable, Optional
+from urllib.parse import urlparse, urlunparse
+
+from crewai_tools import ScrapeWebsiteTool, SerperDevTool
+from pydantic import Field
+
+from sales_personalized_email.circuit_breaker import get_breaker
+from sales_personalized_email.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SERPER_BREAKER = "serper"
+SCRAPE_BREAKER_PREFIX = "scrape:"
+
+# Shared by all researcher agents in the process, so concurrent prospects from the
+# same company issue one Serper query / one scrape of the company site between them
+research_flights = SingleFlight()
+
+
+def _normalize_url(url):
+    parsed = urlparse(url.strip())
+    return urlunparse((
+        (parsed.scheme or "https").lower(),
+        parsed.netloc.lower().removeprefix("www."),
+        parsed.path.rstrip("/") or "/",
+        "",
+        parsed.query,
+        "", # The fragment never changes what is fetched
+    ))
+
+
+def _budget_exhausted(tool):
+    """
+    Ask the tool's budget_check whether the agent is over its budget.
+
+    Returns:
+        A message telling the agent to answer now, or None to go ahead with the call.
+    """
+    reason = tool.budget_check() if tool.budget_check else None
+    if reason:
+        return f"Research budget exhausted ({reason}). Give your final answer now using the information gathered so far."
+    return None
+
+
+def _guarded_run(breaker, run, unavailable_message, **kwargs):
+    """
+    Run a research tool through its circuit breaker. Tool errors are turned into a
+    message for the agent (instead of an exception) so research continues with the
+    information already gathered.
+    """
+    if not breaker.allow_request():
+        logger.warning(f"Circuit '{breaker.name}' open, skipping tool call {kwargs}")
+        return f"{unavailable_message} (temporarily unavailable). Continue with the information gathered so far."
+    try:
+        result = run(**kwargs)
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"Tool call through '{breaker.name}' failed: {e}")
+        return f"{unavailable_message} (error: {e}). Continue with the information gathered so far."
+    breaker.record_success()
+    return result
+
+
+class ResilientSerperDevTool(SerperDevTool):
+    """
+    SerperDevTool behind the 'serper' circuit breaker; identical concurrent
+    queries (case and whitespace insensitive) share one request.
+    """
+
+    budget_check: Optional[Callable[[], Optional[str]]] = Field(default=None, exclude=True)
+
+    def _run(self, **kwargs):
+        exhausted = _budget_exhausted(self)
+        if exhausted:
+            return exhausted
+        query = {k: (v.strip().lower() if isinstance(v, str) else v) for k, v in kwargs.items()}
+        key = ("serper", self.search_type, self.n_results, json.dumps(query, sort_keys=True, default=str))
+        return research_flights.do(
+            key, _guarded_run, get_breaker(SERPER_BREAKER), super()._run, "Web search failed", **kwargs
+        )
+
+
+class ResilientScrapeWebsiteTool(ScrapeWebsiteTool):
+    """
+    ScrapeWebsiteTool behind a per-host circuit breaker, so one hanging site
+    fails fast without blocking scrapes of other sites. Concurrent scrapes of the
+    same (normalized) URL share one fetch.
+    """
+
+    budget_check: Optional[Callable[[], Optional[str]]] = Field(default=None, exclude=True)
+
+    def _run(self, **kwargs):
+        exhausted = _budget_exhausted(self)
+        if exhausted:
+            return exhausted
+        website_url = kwargs.get("website_url") or self.website_url or ""
+        host = urlparse(website_url).netloc.lower() or "unknown"
+        return research_flights.do(
+            ("scrape", _normalize_url(website_url)),
+            _guarded_run,
+            get_breaker(f"{SCRAPE_BREAKER_PREFIX}{host}"),
+            super()._run,
+            f"Scraping {website_url} failed",
+            **kwargs,
+        )
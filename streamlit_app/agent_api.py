@@ -0,0 +1,115 @@
+# streamlit_app/agent_api.py
+"""
+Shared configuration and HTTP helpers for talking to the agent runtime API.
+
+Used by the single-prospect page (app.py) and the bulk submission page
+(pages/1_Bulk_Submission.py) so both pages agree on URLs, tokens and how a
+completed run's result is parsed.
+"""
+import json
+import os
+
+import requests
+from dotenv import load_dotenv # Load environment variables from .env file
+
+load_dotenv()
+
+# --- Cloud URL (edit here if needed) ---
+CLOUD_AGENT_API_BASE_URL = "https://sales-personalized-email-agent.agentic.canary-orion.keboola.dev"
+LOCAL_AGENT_API_BASE_URL = "http://localhost:8082"
+
+# --- Load both tokens from environment ---
+AGENT_API_TOKEN = os.environ.get("AGENT_API_TOKEN")  # For local runner
+CLOUD_AGENT_API_TOKEN = os.environ.get("CLOUD_AGENT_API_TOKEN")  # For cloud runner
+
+POLLING_INTERVAL_SECONDS = 4 # Slightly longer interval for fun messages
+REQUEST_TIMEOUT = 30 # Timeout for individual HTTP requests
+# Overall timeout for waiting for a run to complete, counted from when it starts executing
+POLLING_TIMEOUT_SECONDS = int(os.environ.get("POLLING_TIMEOUT_SECONDS", "360"))
+
+# Fields the crew needs for every prospect (same set the sidebar form asks for)
+PROSPECT_FIELDS = ["name", "title", "company", "industry", "linkedin_url", "our_product", "email_address"]
+
+# Run statuses after which the runtime will not change the run any more
+TERMINAL_STATUSES = {"completed", "error", "timeout", "parsing_error", "submit_error"}
+
+# Run statuses of runs accepted by the runtime but not executing yet
+WAITING_STATUSES = {"submitted", "queued", "pending", "created"}
+
+
+def runner_config(runner_mode):
+    """
+    Return (api_base_url, api_token) for the selected runner mode.
+    """
+    if runner_mode == "Cloud runner":
+        return CLOUD_AGENT_API_BASE_URL, CLOUD_AGENT_API_TOKEN
+    return LOCAL_AGENT_API_BASE_URL, AGENT_API_TOKEN
+
+
+def auth_headers(api_token):
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_token}"
+    }
+
+
+def kickoff_run(api_base_url, api_token, inputs, session=None):
+    """
+    Submit one prospect to the runtime's /kickoff endpoint.
+
+    Returns:
+        The run_id assigned by the runtime.
+
+    Raises:
+        requests.RequestException on HTTP errors, ValueError if no run_id came back.
+    """
+    http = session or requests
+    kickoff_payload = {
+        "crew": "sales_personalized_email", # Make sure this matches crew name if needed
+        "inputs": inputs
+    }
+    response = http.post(f"{api_base_url}/kickoff", headers=auth_headers(api_token), json=kickoff_payload, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    kickoff_data = response.json()
+    run_id = kickoff_data.get("run_id")
+    if not run_id:
+        raise ValueError(f"Failed to get run_id from kickoff response: {kickoff_data}")
+    return run_id
+
+
+def get_run_status(api_base_url, api_token, run_id, session=None):
+    """
+    Fetch the current status payload of a run from /runs/{run_id}.
+    """
+    http = session or requests
+    response = http.get(f"{api_base_url}/runs/{run_id}", headers=auth_headers(api_token), timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def parse_email_result(result):
+    """
+    Extract the PersonalizedEmail fields from a completed run's 'result' payload.
+
+    Returns:
+        dict with subject_line, email_body and follow_up_notes.
+
+    Raises:
+        ValueError if the result does not contain a parsable email.
+    """
+    if not isinstance(result, dict) or "content" not in result:
+        raise ValueError("Completed, but result has no 'content'.")
+    content_data = result["content"]
+    if isinstance(content_data, str):
+        parsed_email_data = json.loads(content_data)
+    elif isinstance(content_data, dict):
+        parsed_email_data = content_data
+    else:
+        raise ValueError("Content is not a string or dictionary")
+    if not isinstance(parsed_email_data, dict):
+        raise ValueError("Completed, but failed to parse email data structure from result content.")
+    return {
+        "subject_line": parsed_email_data.get("subject_line"),
+        "email_body": parsed_email_data.get("email_body"),
+        "follow_up_notes": parsed_email_data.get("follow_up_notes"),
+    }
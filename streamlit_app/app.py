@@ -3,27 +3,17 @@ import streamlit as st
 import requests
 import json
 import time
-import os 
 import random # Import random module
 import urllib.parse # Import urlencode
-from dotenv import load_dotenv # Load environment variables from .env file
-# from dotenv import load_dotenv # Not strictly needed for this version unless storing AGENT_API_TOKEN
-
-# --- Configuration & Environment --- 
-# Load environment variables
-load_dotenv()
-
-# --- Cloud URL (edit here if needed) ---
-CLOUD_AGENT_API_BASE_URL = "https://sales-personalized-email-agent.agentic.canary-orion.keboola.dev"
-LOCAL_AGENT_API_BASE_URL = "http://localhost:8082"
-
-# --- Load both tokens from environment ---
-AGENT_API_TOKEN = os.environ.get("AGENT_API_TOKEN")  # For local runner
-CLOUD_AGENT_API_TOKEN = os.environ.get("CLOUD_AGENT_API_TOKEN")  # For cloud runner
-
-POLLING_INTERVAL_SECONDS = 4 # Slightly longer interval for fun messages
-REQUEST_TIMEOUT = 30 # Timeout for individual HTTP requests
-POLLING_TIMEOUT_SECONDS = 360 # Overall timeout for waiting for the run to complete
+from agent_api import (
+    AGENT_API_TOKEN,
+    CLOUD_AGENT_API_BASE_URL,
+    CLOUD_AGENT_API_TOKEN,
+    LOCAL_AGENT_API_BASE_URL,
+    POLLING_INTERVAL_SECONDS,
+    POLLING_TIMEOUT_SECONDS,
+    REQUEST_TIMEOUT,
+) # Shared with the bulk submission page; also loads the .env file
 
 # --- Funny Status Messages --- 
 FUNNY_STATUS_MESSAGES = [
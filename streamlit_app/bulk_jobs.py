@@ -0,0 +1,268 @@
+# streamlit_app/bulk_jobs.py
+"""
+Background submission and status tracking for bulk (CSV) email generation.
+
+A BulkJob owns one background thread that:
+  1. submits every prospect to /kickoff through a bounded thread pool, and
+  2. meanwhile polls /runs/{run_id} for every submitted run until it finishes.
+
+A run times out `timeout_seconds` after it starts executing (rows queued behind
+the runtime do not use up their time while waiting), and a timed-out run is
+still re-checked for another timeout window in case it completes late. Polling
+always stops `max_wait_seconds` after submission (a run stuck waiting, say), and
+after MAX_CONSECUTIVE_POLL_ERRORS failed polls in a row (a purged run's 404, say),
+so the job thread always finishes.
+
+The Streamlit page only reads snapshots of the job, so reruns never block on HTTP.
+"""
+import csv
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from agent_api import (
+    POLLING_INTERVAL_SECONDS,
+    POLLING_TIMEOUT_SECONDS,
+    PROSPECT_FIELDS,
+    TERMINAL_STATUSES,
+    WAITING_STATUSES,
+    get_run_status,
+    kickoff_run,
+    parse_email_result,
+)
+
+# Default overall deadline after submission, in timeout windows: time queued behind
+# the runtime, the execution timeout and the re-check window after it
+MAX_WAIT_TIMEOUTS = 3
+# A run whose status cannot be read this many times in a row is marked as failed
+MAX_CONSECUTIVE_POLL_ERRORS = 5
+
+# Accepted alternative CSV headers for the prospect fields
+FIELD_ALIASES = {
+    "prospect_email": "email_address",
+    "email": "email_address",
+    "linkedin": "linkedin_url",
+    "product": "our_product",
+}
+
+RESULT_COLUMNS = [
+    "row", "name", "company", "email_address", "run_id", "status",
+    "elapsed_seconds", "subject_line", "email_body", "follow_up_notes", "error",
+]
+
+
+def read_prospects_csv(file_bytes):
+    """
+    Parse an uploaded CSV into prospect input dicts.
+
+    Returns:
+        (prospects, errors) where errors is a list of human readable messages
+        for rows that are missing required fields (those rows are skipped).
+    """
+    text = file_bytes.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(text))
+    prospects = []
+    errors = []
+    for line_number, raw_row in enumerate(reader, start=2): # Line 1 is the header
+        row = {}
+        for key, value in raw_row.items():
+            if key is None:
+                continue
+            field = key.strip().lower().replace(" ", "_")
+            field = FIELD_ALIASES.get(field, field)
+            row[field] = (value or "").strip()
+        missing = [field for field in PROSPECT_FIELDS if not row.get(field)]
+        if missing:
+            errors.append(f"Line {line_number}: missing {', '.join(missing)}")
+            continue
+        prospects.append({field: row[field] for field in PROSPECT_FIELDS})
+    return prospects, errors
+
+
+class BulkJob:
+    """Tracks a batch of /kickoff submissions and their run statuses."""
+
+    def __init__(self, prospects, api_base_url, api_token, concurrency=5, timeout_seconds=None, max_wait_seconds=None):
+        self.api_base_url = api_base_url
+        self.api_token = api_token
+        self.concurrency = max(1, int(concurrency))
+        self.timeout_seconds = timeout_seconds or POLLING_TIMEOUT_SECONDS
+        self.max_wait_seconds = max_wait_seconds or self.timeout_seconds * MAX_WAIT_TIMEOUTS
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._records = [
+            {
+                "row": index + 1,
+                "inputs": inputs,
+                "run_id": None,
+                "status": "queued",
+                "submitted_at": None,
+                "running_since": None, # First poll that saw the run executing
+                "timed_out_at": None,
+                "poll_errors": 0, # Consecutive failed polls
+                "finished_at": None,
+                "email": None,
+                "error": None,
+            }
+            for index, inputs in enumerate(prospects)
+        ]
+        self._thread = threading.Thread(target=self._run, name="bulk-email-job", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    # --- Background work ---
+
+    def _update(self, record, **changes):
+        with self._lock:
+            record.update(changes)
+
+    def _submit(self, session, record):
+        if self._cancelled.is_set():
+            self._update(record, status="submit_error", error="Cancelled before submission", finished_at=time.time())
+            return
+        self._update(record, status="submitting")
+        try:
+            run_id = kickoff_run(self.api_base_url, self.api_token, record["inputs"], session=session)
+            self._update(record, run_id=run_id, status="submitted", submitted_at=time.time())
+        except Exception as e:
+            self._update(record, status="submit_error", error=f"Error during agent API call: {e}", finished_at=time.time())
+
+    def _needs_polling(self, record):
+        """
+        Submitted, not finished and within max_wait_seconds of submission; timed-out
+        runs are re-checked for one more timeout window.
+        """
+        if not record["run_id"] or time.time() - record["submitted_at"] > self.max_wait_seconds:
+            return False
+        if record["status"] == "timeout":
+            return time.time() - record["timed_out_at"] <= self.timeout_seconds
+        return record["status"] not in TERMINAL_STATUSES
+
+    def _expire_overdue(self):
+        """Give up on unfinished runs submitted more than max_wait_seconds ago (caller holds the lock)."""
+        now = time.time()
+        for record in self._records:
+            if (record["run_id"] and record["status"] not in TERMINAL_STATUSES
+                    and now - record["submitted_at"] > self.max_wait_seconds):
+                record.update(
+                    status="timeout", timed_out_at=now, finished_at=now,
+                    error=f"Run did not finish within {self.max_wait_seconds} seconds of submission "
+                          f"(last status: {record['status']}).",
+                )
+
+    def _poll(self, session, record):
+        try:
+            status_data = get_run_status(self.api_base_url, self.api_token, record["run_id"], session=session)
+        except Exception as e:
+            # Transient polling errors are retried on the next round; a run that keeps
+            # failing (e.g. purged from the runtime) is given up on
+            poll_errors = record["poll_errors"] + 1
+            if poll_errors >= MAX_CONSECUTIVE_POLL_ERRORS:
+                self._update(
+                    record, status="error", poll_errors=poll_errors, finished_at=time.time(),
+                    error=f"Error polling run status ({poll_errors} attempts in a row): {e}",
+                )
+            else:
+                self._update(record, poll_errors=poll_errors, error=f"Error polling run status: {e}")
+            return
+        self._update(record, poll_errors=0)
+        current_status = status_data.get("status", "unknown")
+        if current_status == "completed":
+            try:
+                email = parse_email_result(status_data.get("result"))
+                self._update(record, status="completed", email=email, error=None, finished_at=time.time())
+            except Exception as e:
+                self._update(record, status="parsing_error", error=f"Error parsing result: {e}", finished_at=time.time())
+        elif current_status == "error":
+            message = (status_data.get("error") or {}).get("message", "Unknown error")
+            self._update(record, status="error", error=message, finished_at=time.time())
+        elif record["status"] == "timeout":
+            pass # Still not finished; keep re-checking until the second window runs out
+        elif current_status in WAITING_STATUSES:
+            self._update(record, status=current_status, error=None)
+        else:
+            now = time.time()
+            running_since = record["running_since"] or now
+            if now - running_since > self.timeout_seconds:
+                self._update(
+                    record, status="timeout", running_since=running_since, timed_out_at=now, finished_at=now,
+                    error=f"Polling timed out after {self.timeout_seconds} seconds.",
+                )
+            else:
+                self._update(record, status=current_status, running_since=running_since, error=None)
+
+    def _run(self):
+        with requests.Session() as session, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as submit_pool, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as poll_pool:
+            # Runs are polled as soon as they are submitted, not once every row is in
+            submissions = [submit_pool.submit(self._submit, session, record) for record in self._records]
+            while not self._cancelled.is_set():
+                submitting = any(not future.done() for future in submissions)
+                with self._lock:
+                    self._expire_overdue()
+                    pending = [r for r in self._records if self._needs_polling(r)]
+                if not pending and not submitting:
+                    break
+                round_started = time.time()
+                wait([poll_pool.submit(self._poll, session, record) for record in pending])
+                time.sleep(max(0.0, POLLING_INTERVAL_SECONDS - (time.time() - round_started)))
+
+    # --- Snapshots for the UI ---
+
+    def rows(self):
+        """Flat result rows (one per prospect) suitable for tables and downloads."""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for record in self._records:
+                email = record["email"] or {}
+                end = record["finished_at"] or now
+                elapsed = int(end - record["submitted_at"]) if record["submitted_at"] else 0
+                rows.append({
+                    "row": record["row"],
+                    "name": record["inputs"]["name"],
+                    "company": record["inputs"]["company"],
+                    "email_address": record["inputs"]["email_address"],
+                    "run_id": record["run_id"],
+                    "status": record["status"],
+                    "elapsed_seconds": elapsed,
+                    "subject_line": email.get("subject_line"),
+                    "email_body": email.get("email_body"),
+                    "follow_up_notes": email.get("follow_up_notes"),
+                    "error": record["error"],
+                })
+            return rows
+
+    def status_counts(self):
+        counts = {}
+        with self._lock:
+            for record in self._records:
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
+
+
+def rows_to_jsonl(rows):
+    return "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n"
+
+
+def rows_to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RESULT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
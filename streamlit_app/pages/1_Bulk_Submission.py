@@ -0,0 +1,105 @@
+# streamlit_app/pages/1_Bulk_Submission.py
+import streamlit as st
+
+from agent_api import POLLING_INTERVAL_SECONDS, PROSPECT_FIELDS, TERMINAL_STATUSES, runner_config
+from bulk_jobs import BulkJob, read_prospects_csv, rows_to_csv, rows_to_jsonl
+
+# --- Streamlit Page Layout ---
+st.set_page_config(layout="wide")
+st.title(" Bulk Personalized Email Generation")
+st.caption("Upload a CSV of prospects; each row is submitted to the agent API and tracked below.")
+
+st.markdown(
+    "The CSV needs a header row with these columns: "
+    + ", ".join(f"`{field}`" for field in PROSPECT_FIELDS)
+    + " (`prospect_email` or `email` are accepted for `email_address`)."
+)
+
+# --- Inputs ---
+with st.sidebar:
+    runner_mode = st.radio(
+        "Choose where to run the agent:",
+        ("Cloud runner", "Local runner"),
+        index=0,
+        key="bulk_runner_mode",
+    )
+    concurrency = st.slider(
+        "Concurrent submissions",
+        min_value=1,
+        max_value=20,
+        value=5,
+        help="Maximum number of in-flight HTTP requests to the agent API.",
+    )
+
+uploaded_file = st.file_uploader("Prospects CSV", type=["csv"])
+
+if "bulk_job" not in st.session_state:
+    st.session_state.bulk_job = None
+
+prospects = []
+if uploaded_file is not None:
+    prospects, row_errors = read_prospects_csv(uploaded_file.getvalue())
+    st.write(f"{len(prospects)} valid prospect(s) found.")
+    if row_errors:
+        with st.expander(f"{len(row_errors)} row(s) skipped"):
+            for message in row_errors:
+                st.write(message)
+
+job = st.session_state.bulk_job
+job_running = job is not None and not job.done
+
+col_submit, col_cancel = st.columns(2)
+submit_clicked = col_submit.button(
+    "Submit All", type="primary", disabled=not prospects or job_running, key="bulk_submit_button"
+)
+cancel_clicked = col_cancel.button("Cancel Tracking", disabled=not job_running, key="bulk_cancel_button")
+
+if submit_clicked:
+    api_base_url, api_token = runner_config(runner_mode)
+    if not api_token:
+        st.error("No API token configured for the selected runner (AGENT_API_TOKEN / CLOUD_AGENT_API_TOKEN).")
+    else:
+        st.session_state.bulk_job = BulkJob(prospects, api_base_url, api_token, concurrency=concurrency).start()
+
+if cancel_clicked and job is not None:
+    job.cancel()
+
+
+# --- Status table (refreshes on its own without rerunning the whole page) ---
+@st.fragment(run_every=POLLING_INTERVAL_SECONDS)
+def render_job_status():
+    job = st.session_state.bulk_job
+    if job is None:
+        st.info("Upload a CSV and click 'Submit All' to start.")
+        return
+
+    rows = job.rows()
+    counts = job.status_counts()
+    finished = sum(1 for row in rows if row["status"] in TERMINAL_STATUSES)
+    st.progress(finished / len(rows) if rows else 1.0, text=f"{finished}/{len(rows)} finished")
+    st.write(" | ".join(f"**{status}**: {count}" for status, count in sorted(counts.items())))
+    st.dataframe(
+        rows,
+        use_container_width=True,
+        hide_index=True,
+        column_order=["row", "name", "company", "status", "elapsed_seconds", "subject_line", "run_id", "error"],
+    )
+
+    col_jsonl, col_csv = st.columns(2)
+    col_jsonl.download_button(
+        "Download results (JSONL)",
+        rows_to_jsonl(rows),
+        file_name="bulk_email_results.jsonl",
+        mime="application/jsonl",
+    )
+    col_csv.download_button(
+        "Download results (CSV)",
+        rows_to_csv(rows),
+        file_name="bulk_email_results.csv",
+        mime="text/csv",
+    )
+    if job.done:
+        st.success("All runs finished.")
+
+
+render_job_status()
@@ -0,0 +1,64 @@
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sales_personalized_email.archive import DEFAULT_COMMIT_BATCH_SIZE, EmailArchive, archive_email
+
+PROSPECT = {
+    "title": "Head of Data",
+    "company": "Acme Ltd",
+    "industry": "Software",
+    "linkedin_url": "https://www.linkedin.com/in/prospect",
+    "our_product": "SynergyAI Data Analytics Suite",
+}
+
+
+def _run_shard_in_worker(shard_path, archive_path):
+    """Pool worker: run_shard with the crew replaced by a delivery that archives one row."""
+    os.environ["EMAIL_ARCHIVE_PATH"] = archive_path
+    os.environ["CHECKPOINT_DIR"] = ""
+    from sales_personalized_email import main as entry
+    from sales_personalized_email.sharding import run_shard
+
+    def fake_kickoff(inputs, resume, run_id=None):
+        result = {"status_code": 200, "success": True}
+        archive_email(inputs, {"subject_line": f"Hello {inputs['name']}", "email_body": "Body"}, delivery=result)
+        return None, [result]
+
+    entry._kickoff = fake_kickoff
+    return run_shard(shard_path)["succeeded"]
+
+
+def test_shard_worker_commits_partial_archive_batch(tmp_path):
+    """Pool workers exit with os._exit, so rows below batch_size must be committed by run_shard itself."""
+    prospects = 3
+    assert prospects < DEFAULT_COMMIT_BATCH_SIZE
+    shard_path = tmp_path / "shard-000.jsonl"
+    shard_path.write_text(
+        "".join(
+            json.dumps(dict(PROSPECT, name=f"Prospect {n}", email_address=f"prospect{n}@acme.com")) + "\n"
+            for n in range(prospects)
+        ),
+        encoding="utf-8",
+    )
+    archive_path = tmp_path / "archive.sqlite3"
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as pool:
+        succeeded = pool.submit(_run_shard_in_worker, str(shard_path), str(archive_path)).result()
+
+    assert succeeded == prospects
+    with sqlite3.connect(archive_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == prospects
+
+
+def test_pending_rows_are_committed_without_a_later_write(tmp_path):
+    archive = EmailArchive(str(tmp_path / "archive.sqlite3"), commit_interval=0.1)
+    archive.record(PROSPECT, {"subject_line": "Hello", "email_body": "Body"})
+
+    time.sleep(0.5)
+    with sqlite3.connect(archive.path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == 1
+    archive.close()
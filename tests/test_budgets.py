@@ -0,0 +1,48 @@
+from crewai.agents.parser import AgentAction, AgentFinish
+
+from sales_personalized_email import budgets
+from sales_personalized_email.budgets import MAX_RESERVE_FRACTION, RunBudget
+from sales_personalized_email.crew import SalesPersonalizedEmailCrew
+
+
+def test_reserve_is_clamped_to_a_short_run_budget(monkeypatch):
+    monkeypatch.setenv("CREW_RUN_BUDGET_SECONDS", "60")
+    monkeypatch.delenv("CREW_BUDGET_RESERVE_SECONDS", raising=False) # Default 90 s reserve
+    budget = RunBudget.from_env(("prospect_researcher", "email_copywriter"))
+
+    assert budget.reserve_seconds == 60 * MAX_RESERVE_FRACTION
+    # The first agent is not forced to answer on its first step
+    assert budget.check("prospect_researcher") is None
+
+
+def test_reserve_within_the_run_budget_is_kept():
+    budget = RunBudget(run_seconds=300, reserve_seconds=90)
+
+    assert budget.reserve_seconds == 90
+
+
+def test_paused_time_does_not_count_against_the_run_budget(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(budgets.time, "monotonic", lambda: now[0])
+    budget = RunBudget(run_seconds=300, reserve_seconds=0)
+
+    now[0] += 100 # First stage
+    budget.pause()
+    now[0] += 1000 # Queued for the next stage
+    budget.resume()
+    now[0] += 100 # Second stage
+
+    assert budget.check("email_copywriter") is None
+    assert budget.snapshot()["elapsed_seconds"] == 200
+
+
+def test_react_tool_step_is_counted_once():
+    crew_manager = SalesPersonalizedEmailCrew()
+    researcher = crew_manager.prospect_researcher()
+    budget_check = researcher.tools[0].budget_check
+
+    budget_check() # The tool call...
+    researcher.step_callback(AgentAction(thought="", tool="search", tool_input="{}", text="", result="found")) # ...its ReAct step
+    researcher.step_callback(AgentFinish(thought="", output="dossier", text="dossier"))
+
+    assert crew_manager._run_budget().steps == 2
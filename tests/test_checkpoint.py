@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from crewai.tasks.task_output import TaskOutput
+
+from sales_personalized_email import crew as crew_module
+from sales_personalized_email import main
+from sales_personalized_email.checkpoint import CheckpointStore, prune_checkpoints
+from sales_personalized_email.crew import SalesPersonalizedEmailCrew
+
+INPUTS = {"name": "Jane Doe", "email_address": "jane@example.com", "company": "Acme Ltd"}
+DELIVERED = [{"success": True, "status_code": 200}]
+
+
+def _email_output():
+    return TaskOutput(
+        name="write_email_task",
+        description="Write the email",
+        raw='{"subject_line": "Hello", "email_body": "Body"}',
+        json_dict={"subject_line": "Hello", "email_body": "Body"},
+        agent="Email Copywriter",
+    )
+
+
+def test_save_after_delivery_keeps_the_delivered_marker(tmp_path):
+    checkpoint = CheckpointStore(INPUTS, run_id="run", directory=tmp_path)
+    checkpoint.save_task_output("write_email_task", _email_output())
+    checkpoint.mark_delivered(DELIVERED)
+
+    assert not checkpoint.save_task_output("write_email_task", _email_output())
+    reloaded = CheckpointStore.latest(INPUTS, directory=tmp_path)
+    assert reloaded.delivered
+    assert reloaded.delivery_results() == DELIVERED
+
+
+@pytest.mark.parametrize("delivered_first", [True, False])
+def test_email_is_checkpointed_once_around_background_delivery(tmp_path, monkeypatch, delivered_first):
+    """The delivery future can complete before or after crewai calls the crew-level task callback."""
+    delivery = Future()
+    monkeypatch.setenv("EMAIL_DELIVERY_MODE", "async")
+    monkeypatch.setattr(crew_module, "submit_email_variants", lambda **kwargs: delivery)
+    crew_manager = SalesPersonalizedEmailCrew()
+    crew_manager._crew_instance_inputs = INPUTS
+    crew_manager._checkpoint = CheckpointStore(INPUTS, run_id="run", directory=tmp_path)
+    saved = []
+    save_task_output = crew_manager._checkpoint.save_task_output
+    monkeypatch.setattr(
+        crew_manager._checkpoint, "save_task_output",
+        lambda task_name, output: saved.append(task_name) or save_task_output(task_name, output),
+    )
+
+    output = _email_output()
+    crew_manager.store_email_callback(output) # Task callback: checkpoint, then submit the delivery
+    if delivered_first:
+        delivery.set_result(DELIVERED)
+    crew_manager.on_task_completed(output) # Crew-level callback for the same task
+    if not delivered_first:
+        delivery.set_result(DELIVERED)
+
+    assert saved == ["write_email_task"]
+    reloaded = CheckpointStore.latest(INPUTS, directory=tmp_path)
+    assert reloaded.delivered
+    assert reloaded.task_output("write_email_task")["json_dict"] == output.json_dict
+
+
+def test_resumed_task_gets_every_completed_task_as_context(tmp_path):
+    checkpoint = CheckpointStore(INPUTS, run_id="run", directory=tmp_path)
+    for task_name in ("research_prospect_task", "personalize_content_task"):
+        checkpoint.save_task_output(
+            task_name, TaskOutput(name=task_name, description=task_name, raw=f"{task_name} output", agent="Agent")
+        )
+    crew_manager = SalesPersonalizedEmailCrew()
+    crew_manager._checkpoint = checkpoint
+
+    tasks = crew_manager.crew().tasks
+
+    assert [task.name for task in tasks] == ["write_email_task"]
+    assert [task.output.raw for task in tasks[0].context] == [
+        "research_prospect_task output",
+        "personalize_content_task output",
+    ]
+
+
+def test_resume_does_not_resend_an_email_queued_to_the_outbox(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setenv("EMAIL_ARCHIVE_PATH", "")
+    sent = []
+    queued = {"status_code": 503, "success": False, "queued_to_outbox": True}
+    monkeypatch.setattr(crew_module, "send_email_to_api", lambda **kwargs: sent.append(kwargs) or dict(queued))
+    checkpoint = CheckpointStore(INPUTS, run_id="run")
+    for task_name in ("research_prospect_task", "personalize_content_task"):
+        checkpoint.save_task_output(task_name, TaskOutput(name=task_name, description=task_name, raw="", agent="Agent"))
+    checkpoint.save_task_output("write_email_task", _email_output())
+
+    crew_module.deliver_checkpointed_email(checkpoint, INPUTS)
+    _, api_call_results = main._kickoff(INPUTS, resume=True)
+
+    assert len(sent) == 1
+    assert api_call_results == [dict(queued, variant_id=None)]
+
+
+def test_prune_deletes_only_checkpoints_past_retention(tmp_path):
+    old = CheckpointStore(INPUTS, run_id="old", directory=tmp_path)
+    old.save_task_output("research_prospect_task", TaskOutput(name="research_prospect_task", description="", raw="r", agent="Agent"))
+    fresh = CheckpointStore(dict(INPUTS, name="John Roe"), run_id="fresh", directory=tmp_path)
+    fresh.save_task_output("research_prospect_task", TaskOutput(name="research_prospect_task", description="", raw="r", agent="Agent"))
+    week_ago = time.time() - 7 * 24 * 3600
+    os.utime(old.path, (week_ago, week_ago))
+
+    assert prune_checkpoints(tmp_path, retention=24 * 3600) == 1
+    assert not old.path.parent.exists()
+    assert fresh.path.exists()